@@ -1,39 +1,187 @@
+import argparse
+import csv
+import io
+import json
+import os
 from pathlib import Path
+import numpy as np
 import pandas as pd
 
+try:
+    from .parquet_store import CSV, CSV_DTYPES, coerce_types, head_hash, iter_csv_tail, read_telemetry
+except ImportError:
+    from parquet_store import CSV, CSV_DTYPES, coerce_types, head_hash, iter_csv_tail, read_telemetry
+
+AGG_COLUMNS = ['timestamp_utc', 'lat', 'lon', 'waste_category', 'loadcell_grams', 'tds_ppm']
+
 
 def tile_key(lat: float, lon: float, precision: int = 3):
     return (round(float(lat), precision), round(float(lon), precision))
 
 
-def aggregate(csv_path: Path, tile_precision: int = 3) -> pd.DataFrame:
-    df = pd.read_csv(csv_path, parse_dates=['timestamp_utc'])
-    df = df.dropna(subset=['lat', 'lon'])
-    df['lat'] = pd.to_numeric(df['lat'], errors='coerce')
-    df['lon'] = pd.to_numeric(df['lon'], errors='coerce')
-    df = df.dropna(subset=['lat', 'lon'])
-    df['tile_lat'] = df['lat'].round(tile_precision)
-    df['tile_lon'] = df['lon'].round(tile_precision)
-    df['date'] = pd.to_datetime(df['timestamp_utc']).dt.date
-
-    def weight_row(r):
-        w = 1
-        try:
-            p = (r.get('waste_category') or '').lower()
-            if 'hazard' in p:
-                w = 3
-            elif 'wet' in p:
-                w = 2
-        except Exception:
-            w = 1
-        return w
-
-    df['weight'] = df.apply(lambda row: weight_row(row), axis=1)
-    df['loadcell_grams'] = pd.to_numeric(df.get('loadcell_grams', 0), errors='coerce').fillna(0)
-
-    agg = df.groupby(['tile_lat', 'tile_lon', 'date']).agg(
-        waste_count=('weight', 'count'),
+def category_weight(category) -> int:
+    """Weight of one waste_category value: 3 for hazard, 2 for wet, 1 otherwise."""
+    p = category.lower() if isinstance(category, str) else ''
+    return 3 if 'hazard' in p else 2 if 'wet' in p else 1
+
+
+def category_weights(categories: pd.Series) -> np.ndarray:
+    """Per-row `category_weight` of a waste_category column.
+
+    The string checks run once per distinct category, not once per row.
+    """
+    cat = categories.astype('category')
+    per_cat = np.array([category_weight(str(c)) for c in cat.cat.categories], dtype=np.int8)
+    codes = cat.cat.codes.to_numpy()
+    weights = np.ones(len(codes), dtype=np.int8)  # missing category -> 1
+    known = codes >= 0
+    weights[known] = per_cat[codes[known]]
+    return weights
+
+
+AGG_KEYS = ['tile_lat', 'tile_lon', 'date']
+
+
+def partial_aggregates(df: pd.DataFrame, tile_precision: int = 3) -> pd.DataFrame:
+    """Mergeable per-(tile, date) sums of typed telemetry (see parquet_store.read_telemetry).
+
+    Partials from disjoint row sets can be added together; `finalize` turns
+    them into the published aggregate columns.
+    """
+    lat = pd.to_numeric(df['lat'], errors='coerce').to_numpy(dtype=np.float64)
+    lon = pd.to_numeric(df['lon'], errors='coerce').to_numpy(dtype=np.float64)
+    ts = pd.to_datetime(df['timestamp_utc'], errors='coerce')
+    keep = ~(np.isnan(lat) | np.isnan(lon))
+    if not keep.all():
+        df, lat, lon, ts = df[keep], lat[keep], lon[keep], ts[keep]
+
+    tds = pd.to_numeric(df['tds_ppm'], errors='coerce').to_numpy()
+    work = pd.DataFrame({
+        'tile_lat': np.round(lat, tile_precision),
+        'tile_lon': np.round(lon, tile_precision),
+        'date': ts.dt.floor('D').to_numpy(),
+        'weight': category_weights(df['waste_category']),
+        'loadcell_grams': pd.to_numeric(df['loadcell_grams'], errors='coerce').fillna(0).to_numpy(),
+        'tds_sum': np.nan_to_num(tds),
+        'tds_count': (~np.isnan(tds)).astype(np.int64),
+    })
+    part = work.groupby(AGG_KEYS, sort=True).agg(
+        waste_count=('weight', 'size'),
+        weighted_count=('weight', 'sum'),
         total_mass=('loadcell_grams', 'sum'),
-        avg_tds=('tds_ppm', lambda x: pd.to_numeric(x, errors='coerce').mean())
+        tds_sum=('tds_sum', 'sum'),
+        tds_count=('tds_count', 'sum'),
     ).reset_index()
+    part['weighted_count'] = part['weighted_count'].astype(np.int64)
+    return part
+
+
+def merge_partials(*parts: pd.DataFrame) -> pd.DataFrame:
+    parts = [p for p in parts if p is not None and len(p)]
+    if not parts:
+        return partial_aggregates(pd.DataFrame(columns=AGG_COLUMNS))
+    if len(parts) == 1:
+        return parts[0]
+    return pd.concat(parts, ignore_index=True).groupby(AGG_KEYS, sort=True).sum().reset_index()
+
+
+def finalize(part: pd.DataFrame) -> pd.DataFrame:
+    agg = part[AGG_KEYS + ['waste_count', 'weighted_count', 'total_mass']].copy()
+    agg['avg_tds'] = part['tds_sum'] / part['tds_count'].where(part['tds_count'] > 0)
+    agg['date'] = pd.to_datetime(agg['date']).dt.date
     return agg
+
+
+def aggregate_frame(df: pd.DataFrame, tile_precision: int = 3) -> pd.DataFrame:
+    """Per-(tile, date) aggregates of typed telemetry (see parquet_store.read_telemetry)."""
+    return finalize(partial_aggregates(df, tile_precision))
+
+
+def aggregate(csv_path: Path, tile_precision: int = 3, start=None, end=None) -> pd.DataFrame:
+    # only the needed columns, and only the days in [start, end] when the Parquet store is ready
+    df = read_telemetry(csv_path, columns=AGG_COLUMNS, start=start, end=end)
+    return aggregate_frame(df, tile_precision)
+
+
+def _write_atomic(path: Path, text: str):
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_text(text, encoding='utf-8')
+    os.replace(tmp, path)
+
+
+def aggregate_incremental(csv_path: Path = CSV, tile_precision: int = 3, state_dir: Path = None) -> pd.DataFrame:
+    """Same result as `aggregate`, but only parses rows appended since the last run.
+
+    Per-(tile, date) partial sums and a watermark (byte offset into the CSV plus
+    the last timestamp seen) are kept in `state_dir`. A run reads the tail past
+    the offset, merges its partials into the stored ones and advances the
+    watermark. If the file was truncated or rewritten (header, size or prefix
+    fingerprint mismatch) the state is rebuilt from the start.
+    """
+    csv_path = Path(csv_path)
+    state_dir = Path(state_dir) if state_dir else csv_path.parent / 'aggregate_state'
+    state_dir.mkdir(parents=True, exist_ok=True)
+    wm_file = state_dir / 'watermark.json'
+    parts_file = state_dir / 'daily_partials.csv'
+
+    size = csv_path.stat().st_size
+    with open(csv_path, 'rb') as f:
+        header_line = f.readline()
+    header = next(csv.reader([header_line.decode('utf-8', errors='replace')]), [])
+
+    wm = json.loads(wm_file.read_text()) if wm_file.exists() else None
+    valid = (
+        wm is not None and parts_file.exists()
+        and wm.get('tile_precision') == tile_precision
+        and wm.get('header') == header
+        and len(header_line) <= wm.get('offset', 0) <= size
+        and wm.get('head_sha1') == head_hash(csv_path, wm['offset'])
+    )
+    if valid:
+        stored = pd.read_csv(parts_file, parse_dates=['date'])
+        offset = wm['offset']
+        last_ts = wm.get('last_timestamp')
+    else:
+        stored = None
+        offset = len(header_line)
+        last_ts = None
+
+    usecols = [c for c in AGG_COLUMNS if c in header]
+    dtypes = {c: t for c, t in CSV_DTYPES.items() if c in usecols}
+    new_parts = []
+    for block, offset in iter_csv_tail(csv_path, offset, size):
+        df = pd.read_csv(io.BytesIO(block), names=header, header=None, usecols=usecols,
+                         dtype=dtypes, on_bad_lines='skip')
+        df = coerce_types(df).reindex(columns=AGG_COLUMNS)
+        if df['timestamp_utc'].notna().any():
+            block_max = str(df['timestamp_utc'].max())
+            last_ts = max(last_ts, block_max) if last_ts else block_max
+        new_parts.append(partial_aggregates(df, tile_precision))
+
+    merged = merge_partials(stored, *new_parts)
+    if new_parts or not valid:
+        out = merged.copy()
+        out['date'] = pd.to_datetime(out['date']).dt.strftime('%Y-%m-%d')
+        _write_atomic(parts_file, out.to_csv(index=False))
+        _write_atomic(wm_file, json.dumps({
+            'offset': offset,
+            'header': header,
+            'head_sha1': head_hash(csv_path, offset),
+            'tile_precision': tile_precision,
+            'last_timestamp': last_ts,
+        }, indent=2))
+    return finalize(merged)
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description='Daily per-tile telemetry aggregates')
+    p.add_argument('--csv', default=str(CSV))
+    p.add_argument('--precision', type=int, default=3)
+    p.add_argument('--incremental', action='store_true', help='only read rows appended since the last run')
+    p.add_argument('--out', help='write the aggregate CSV here (default: print)')
+    a = p.parse_args()
+    result = aggregate_incremental(Path(a.csv), a.precision) if a.incremental else aggregate(Path(a.csv), a.precision)
+    if a.out:
+        result.to_csv(a.out, index=False)
+    else:
+        print(result.to_string(index=False))
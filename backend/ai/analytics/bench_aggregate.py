@@ -0,0 +1,113 @@
+"""Throughput benchmark for aggregate_daily.aggregate on synthetic telemetry.
+
+Usage:
+  python backend/ai/analytics/bench_aggregate.py --rows 10000000
+  python backend/ai/analytics/bench_aggregate.py --rows 10000000 --keep-csv /tmp/telemetry_10m.csv
+
+Writes a synthetic telemetry CSV (canonical header), then times the full
+aggregate() call (CSV parse + aggregation) and the in-memory aggregation
+alone. The previous row-wise implementation (df.apply per row, reading the CSV
+itself) is timed on a --legacy-rows sample CSV for comparison, since it is too
+slow to run on 10M rows; its output frame must equal aggregate()'s on that sample.
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    from .aggregate_daily import aggregate, aggregate_frame
+    from .parquet_store import read_telemetry
+    from .telemetry_schema import CANONICAL_HEADER
+except ImportError:
+    from aggregate_daily import aggregate, aggregate_frame
+    from parquet_store import read_telemetry
+    from telemetry_schema import CANONICAL_HEADER
+
+CATEGORIES = np.array(['dry', 'wet', 'hazard', 'plastic:0.88', '-', 'unknown'])
+
+
+def synthetic_telemetry(rows: int, tiles: int = 2000, days: int = 90, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    tile = rng.integers(0, tiles, rows)
+    base = pd.Timestamp('2025-01-01').value // 10**9
+    secs = base + rng.integers(0, days * 86400, rows)
+    df = pd.DataFrame({c: '' for c in CANONICAL_HEADER}, index=range(rows))
+    df['timestamp_utc'] = pd.to_datetime(secs, unit='s').strftime('%Y-%m-%d %H:%M:%S')
+    df['boat_id'] = 'boat' + (tile % 20).astype(str)
+    df['lat'] = np.round(22.0 + (tile // 50) * 0.01 + rng.random(rows) * 0.001, 6)
+    df['lon'] = np.round(88.0 + (tile % 50) * 0.01 + rng.random(rows) * 0.001, 6)
+    df['loadcell_grams'] = rng.integers(0, 3000, rows)
+    df['tds_ppm'] = np.where(rng.random(rows) < 0.1, np.nan, rng.normal(450, 50, rows).round(1))
+    df['waste_category'] = CATEGORIES[rng.integers(0, len(CATEGORIES), rows)]
+    return df
+
+
+def legacy_aggregate(csv_path: Path, tile_precision: int = 3) -> pd.DataFrame:
+    # the original row-wise implementation, CSV parse included, kept for comparison only
+    df = pd.read_csv(csv_path, parse_dates=['timestamp_utc'])
+    df = df.dropna(subset=['lat', 'lon'])
+    df['lat'] = pd.to_numeric(df['lat'], errors='coerce')
+    df['lon'] = pd.to_numeric(df['lon'], errors='coerce')
+    df = df.dropna(subset=['lat', 'lon'])
+    df['tile_lat'] = df['lat'].round(tile_precision)
+    df['tile_lon'] = df['lon'].round(tile_precision)
+    df['date'] = pd.to_datetime(df['timestamp_utc']).dt.date
+
+    def weight_row(r):
+        p = (r.get('waste_category') or '').lower()
+        return 3 if 'hazard' in p else 2 if 'wet' in p else 1
+
+    df['weight'] = df.apply(lambda row: weight_row(row), axis=1)
+    df['loadcell_grams'] = pd.to_numeric(df.get('loadcell_grams', 0), errors='coerce').fillna(0)
+    return df.groupby(['tile_lat', 'tile_lon', 'date']).agg(
+        waste_count=('weight', 'count'),
+        total_mass=('loadcell_grams', 'sum'),
+        avg_tds=('tds_ppm', lambda x: pd.to_numeric(x, errors='coerce').mean())
+    ).reset_index()
+
+
+def timed(label, rows, fn):
+    t0 = time.perf_counter()
+    out = fn()
+    dt = time.perf_counter() - t0
+    print(f"{label:<32} {rows:>11,d} rows  {dt:8.2f} s  {rows / dt:>13,.0f} rows/s")
+    return out
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('--rows', type=int, default=10_000_000)
+    p.add_argument('--legacy-rows', type=int, default=200_000)
+    p.add_argument('--keep-csv', help='write the synthetic CSV here and keep it')
+    args = p.parse_args()
+
+    t0 = time.perf_counter()
+    df = synthetic_telemetry(args.rows)
+    csv_path = Path(args.keep_csv) if args.keep_csv else Path(tempfile.mkdtemp()) / 'telemetry.csv'
+    df.to_csv(csv_path, index=False)
+    print(f"generated {args.rows:,d} rows -> {csv_path} in {time.perf_counter() - t0:.1f} s")
+
+    typed = read_telemetry(csv_path, columns=['timestamp_utc', 'lat', 'lon', 'waste_category', 'loadcell_grams', 'tds_ppm'])
+    agg = timed('aggregate() end-to-end', args.rows, lambda: aggregate(csv_path))
+    timed('aggregate_frame() in memory', args.rows, lambda: aggregate_frame(typed))
+
+    sample_path = csv_path.with_name(csv_path.stem + '_sample.csv')
+    df.head(args.legacy_rows).to_csv(sample_path, index=False)
+    n = min(args.rows, args.legacy_rows)
+    legacy = timed('legacy row-wise (sample)', n, lambda: legacy_aggregate(sample_path))
+    check = timed('aggregate() (same sample)', n, lambda: aggregate(sample_path))
+    # aggregate() also returns weighted_count, which the legacy code never computed
+    pd.testing.assert_frame_equal(check[legacy.columns], legacy, check_dtype=False)
+    print(f"{len(agg):,d} (tile, date) groups; sample output matches legacy")
+    sample_path.unlink()
+
+    if not args.keep_csv:
+        csv_path.unlink()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Persistent LRU cache of per-tile forecasts, used by forecast_tiles.
+
+Each entry is keyed by tile and remembers the length of the series it was
+fitted on, a digest of its complete days and one of the still-filling days
+(today), the forecast itself and (for Holt-Winters tiles) the fitted
+parameters. A tile whose series is unchanged is served from the cache; one
+whose complete days are unchanged but that gained days or an updated partial
+day is refitted (from scratch by default, or starting from the cached
+parameters with forecast_tiles(refit="warm"/"best")).
+"""
+import hashlib
+import os
+import pickle
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+BASE = Path(__file__).resolve().parents[2]
+CACHE_FILE = BASE / "data" / "forecast_cache.pkl"
+CACHE_VERSION = 2
+
+
+def series_digest(*arrays) -> str:
+    h = hashlib.sha1()
+    for a in arrays:
+        h.update(np.ascontiguousarray(a, dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+
+class ForecastCache:
+    """Tile -> fitted forecast entries, least recently used evicted first.
+
+    `config` identifies the forecast settings the entries were produced with;
+    switching to a different config drops them. `save()` writes the cache
+    atomically; a missing or unreadable file just starts an empty cache.
+    """
+
+    def __init__(self, path=CACHE_FILE, max_entries: int = 100_000):
+        self.path = Path(path) if path else None
+        self.max_entries = max_entries
+        self.config = None
+        self._entries = OrderedDict()
+        self._dirty = False
+        self.stats = {"hits": 0, "warm": 0, "cold": 0}
+        if self.path is not None and self.path.exists():
+            self.load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self):
+        try:
+            with open(self.path, "rb") as f:
+                data = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return
+        if not isinstance(data, dict) or data.get("version") != CACHE_VERSION:
+            return
+        self.config = data.get("config")
+        self._entries = OrderedDict(data.get("entries", []))
+
+    def save(self):
+        if self.path is None or not self._dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump({"version": CACHE_VERSION, "config": self.config,
+                         "entries": list(self._entries.items())}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path)
+        self._dirty = False
+
+    def use_config(self, config):
+        """Start a run with these settings; entries from other settings are dropped."""
+        if config != self.config:
+            self._entries.clear()
+            self.config = config
+            self._dirty = True
+        self.stats = {"hits": 0, "warm": 0, "cold": 0}
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry: dict):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._dirty = True
+
+    def clear(self):
+        self._entries.clear()
+        self._dirty = True
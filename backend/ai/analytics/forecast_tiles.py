@@ -1,40 +1,243 @@
+import datetime
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import pandas as pd
 import numpy as np
 
+# below this many tiles the pool start-up costs more than it saves
+PARALLEL_MIN_TILES = 64
+# series shorter than this are forecast in one batched closed-form pass
+SHORT_SERIES_DAYS = 14
+SES_ALPHA = 0.5
+REFIT_MODES = ('cold', 'warm', 'best')
 
-def forecast_series(series: pd.Series, days: int = 7) -> pd.Series:
+try:
+    from .forecast_cache import series_digest
+except ImportError:
+    from forecast_cache import series_digest
+
+
+def fit_series(values, days: int = 7, start_params=None, check_cold: bool = False):
+    """Holt-Winters (additive trend) forecast of `values` and the fitted parameters.
+
+    `start_params` ([alpha, beta, initial_level, initial_trend] from an earlier
+    fit of the same series) replaces the brute-force search for starting values.
+    The optimiser can then settle in a different local optimum than a cold fit,
+    so forecasts may differ slightly; with `check_cold` a cold fit is run as
+    well and the one with the lower SSE (higher likelihood) is kept.
+    Falls back to a linear trend, with no parameters, when the fit fails.
+    """
+    series = pd.Series(np.asarray(values, dtype=float))
     try:
         from statsmodels.tsa.holtwinters import ExponentialSmoothing
         model = ExponentialSmoothing(series, trend='add', seasonal=None)
-        fit = model.fit(optimized=True)
-        pred = fit.forecast(days)
-        return pd.Series(pred)
+        if start_params is not None:
+            fit = model.fit(optimized=True, start_params=np.asarray(start_params, dtype=float), use_brute=False)
+            if check_cold:
+                cold = model.fit(optimized=True)
+                if cold.sse < fit.sse:
+                    fit = cold
+        else:
+            fit = model.fit(optimized=True)
+        p = fit.params
+        params = [float(p[k]) for k in ('smoothing_level', 'smoothing_trend', 'initial_level', 'initial_trend')]
+        return np.asarray(fit.forecast(days)), params
     except Exception:
         # fallback linear
         x = np.arange(len(series))
         if len(x) < 2:
-            return pd.Series([series.iloc[-1]] * days)
+            return np.array([series.iloc[-1]] * days), None
         coeffs = np.polyfit(x, series.values, 1)
         xs = np.arange(len(series), len(series)+days)
-        preds = np.polyval(coeffs, xs)
-        return pd.Series(preds)
-
-
-def forecast_tiles(agg_df: pd.DataFrame, days: int = 7):
-    out = {}
-    for (lat, lon), grp in agg_df.groupby(['tile_lat', 'tile_lon']):
-        grp2 = grp.sort_values('date')
-        wc_series = grp2['waste_count'].astype(float).reset_index(drop=True)
-        mass_series = grp2['total_mass'].astype(float).reset_index(drop=True)
-        if len(wc_series) == 0:
-            continue
-        wc_pred = forecast_series(wc_series, days=days)
-        mass_pred = forecast_series(mass_series, days=days)
-        key = f"{lat}_{lon}"
-        out[key] = {
-            'tile': (lat, lon),
-            'waste_count_pred': wc_pred.tolist(),
-            'mass_pred': mass_pred.tolist()
-        }
+        return np.polyval(coeffs, xs), None
+
+
+def forecast_series(series: pd.Series, days: int = 7) -> pd.Series:
+    return pd.Series(fit_series(series, days)[0])
+
+
+def batched_forecast(values: np.ndarray, lengths: np.ndarray, days: int = 7,
+                     method: str = 'linear', alpha: float = SES_ALPHA) -> np.ndarray:
+    """Forecast many short series at once.
+
+    `values` is a (k, width) matrix with series i left-aligned in row i and
+    `lengths[i]` valid entries (the padding is ignored). Returns a (k, days)
+    matrix. 'linear' is the least-squares trend line (the last value when a
+    series has one point), 'ses' is simple exponential smoothing.
+    """
+    values = np.asarray(values, dtype=float)
+    n = np.asarray(lengths, dtype=float)
+    k, width = values.shape
+    valid = np.arange(width) < n[:, None]
+    y = np.where(valid, values, 0.0)
+    if method == 'ses':
+        level = y[:, 0].copy()
+        for j in range(1, width):
+            level = np.where(valid[:, j], alpha * y[:, j] + (1 - alpha) * level, level)
+        return np.repeat(level[:, None], days, axis=1)
+    if method != 'linear':
+        raise ValueError(f"unknown method: {method}")
+    # closed-form OLS over x = 0..n-1 for every row
+    x = np.arange(width, dtype=float)
+    sx = n * (n - 1) / 2
+    sxx = (n - 1) * n * (2 * n - 1) / 6
+    sy = y.sum(axis=1)
+    sxy = (y * x).sum(axis=1)
+    denom = n * sxx - sx * sx
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(n >= 2, (n * sxy - sx * sy) / denom, 0.0)
+        intercept = (sy - slope * sx) / n
+    steps = n[:, None] + np.arange(days)
+    return intercept[:, None] + slope[:, None] * steps
+
+
+def _tile_arrays(agg_df: pd.DataFrame):
+    # date-ordered rows grouped by tile (tiles sorted), plus each tile's start row and length
+    df = agg_df.sort_values(['tile_lat', 'tile_lon', 'date'], kind='mergesort')
+    lat = df['tile_lat'].to_numpy()
+    lon = df['tile_lon'].to_numpy()
+    if len(df) == 0:
+        starts = np.zeros(0, dtype=np.int64)
+    else:
+        starts = np.flatnonzero(np.r_[True, (lat[1:] != lat[:-1]) | (lon[1:] != lon[:-1])])
+    lengths = np.diff(np.r_[starts, len(df)])
+    wc = df['waste_count'].to_numpy(dtype=float)
+    mass = df['total_mass'].to_numpy(dtype=float)
+    dates = pd.to_datetime(df['date']).to_numpy(dtype='datetime64[D]')
+    return lat, lon, wc, mass, dates, starts, lengths
+
+
+def tile_series(agg_df: pd.DataFrame):
+    """(lat, lon, waste_count, total_mass) per tile, date-ordered, tiles in sorted order."""
+    lat, lon, wc, mass, _, starts, lengths = _tile_arrays(agg_df)
+    for s, n in zip(starts, lengths):
+        yield lat[s], lon[s], wc[s:s + n], mass[s:s + n]
+
+
+def _padded(values, starts, lengths):
+    # gather each tile's slice into a left-aligned (tiles, max_len) matrix
+    width = int(lengths.max()) if len(lengths) else 0
+    out = np.zeros((len(starts), width))
+    rows = np.repeat(np.arange(len(starts)), lengths)
+    cols = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    out[rows, cols] = values[np.repeat(starts, lengths) + cols]
     return out
+
+
+def _forecast_tile(lat, lon, wc, mass, warm, days, check_cold=False):
+    wc_start, mass_start = warm or (None, None)
+    wc_pred, wc_params = fit_series(wc, days, wc_start, check_cold)
+    mass_pred, mass_params = fit_series(mass, days, mass_start, check_cold)
+    return f"{lat}_{lon}", {
+        'tile': (lat, lon),
+        'waste_count_pred': wc_pred.tolist(),
+        'mass_pred': mass_pred.tolist()
+    }, (wc_params, mass_params) if wc_params and mass_params else None
+
+
+def _forecast_chunk(chunk, days, check_cold=False):
+    # runs in a worker process; a chunk is a list of (lat, lon, wc, mass, warm) tuples
+    return [_forecast_tile(*t, days, check_cold) for t in chunk]
+
+
+def forecast_tiles(agg_df: pd.DataFrame, days: int = 7, workers: int = 1, chunk_size: int = None,
+                   short_threshold: int = SHORT_SERIES_DAYS, short_method: str = 'linear', cache=None,
+                   refit: str = 'cold', today=None):
+    """Forecast waste_count and total_mass for every tile.
+
+    Tiles with fewer than `short_threshold` days are forecast together by
+    `batched_forecast` (`short_method`); only longer series are fitted with
+    Holt-Winters. With workers > 1 (None = all CPUs) those fits are split into
+    chunks and run in a process pool. The result is keyed and ordered by tile
+    the same way regardless of the worker count.
+
+    With a `ForecastCache`, tiles whose series did not change are not
+    recomputed, and Holt-Winters tiles that only gained or updated days are
+    refitted according to `refit`:
+    - "cold" (default): a fresh fit, identical to running without a cache
+    - "warm": start from the cached parameters (faster, but the optimiser may
+      settle elsewhere: forecasts can differ noticeably from a cold fit)
+    - "best": warm and cold fit, keep the one with the higher likelihood
+    Cache entries are validated by a digest of the complete days only; days on
+    or after `today` (default: the current UTC date) are still filling up and
+    are compared separately, so a growing partial day does not look like a
+    rewritten history. The cache is saved before returning.
+    """
+    if refit not in REFIT_MODES:
+        raise ValueError(f"refit must be one of {REFIT_MODES}, got {refit!r}")
+    lat, lon, wc, mass, dates, starts, lengths = _tile_arrays(agg_df)
+    todo = lengths > 0
+    results, warm, params = {}, {}, {}
+    today = np.datetime64(today or datetime.datetime.now(datetime.timezone.utc).date(), 'D')
+    # per tile, the number of leading days that are complete (dates are sorted within a tile)
+    partial = np.bincount(np.repeat(np.arange(len(starts)), lengths), weights=dates >= today, minlength=len(starts))
+    complete = lengths - partial.astype(np.int64)
+
+    if cache is not None:
+        cache.use_config((days, short_threshold, short_method))
+        for i in np.flatnonzero(todo):
+            s, n = starts[i], lengths[i]
+            key = f"{lat[s]}_{lon[s]}"
+            entry = cache.get(key)
+            if entry is None or entry['complete'] > complete[i]:
+                continue
+            c = entry['complete']
+            if entry['digest'] != series_digest(wc[s:s + c], mass[s:s + c]):
+                continue  # history rewritten: fit from scratch
+            if entry['n'] == n and entry['tail'] == series_digest(wc[s + c:s + n], mass[s + c:s + n]):
+                results[s] = (key, entry['result'])
+                todo[i] = False
+                cache.stats['hits'] += 1
+            elif entry['params'] and refit != 'cold':
+                warm[s] = entry['params']
+
+    short = todo & (lengths < short_threshold)
+    if short.any():
+        s_starts, s_len = starts[short], lengths[short]
+        preds = batched_forecast(np.vstack([_padded(wc, s_starts, s_len), _padded(mass, s_starts, s_len)]),
+                                 np.r_[s_len, s_len], days, method=short_method)
+        wc_pred, mass_pred = preds[:len(s_starts)], preds[len(s_starts):]
+        for i, s in enumerate(s_starts):
+            results[s] = (f"{lat[s]}_{lon[s]}", {
+                'tile': (lat[s], lon[s]),
+                'waste_count_pred': wc_pred[i].tolist(),
+                'mass_pred': mass_pred[i].tolist()
+            })
+
+    long_ = todo & ~short
+    l_starts = starts[long_].tolist()
+    tiles = [(lat[s], lon[s], wc[s:s + n], mass[s:s + n], warm.get(s))
+             for s, n in zip(l_starts, lengths[long_])]
+    workers = (os.cpu_count() or 1) if workers is None else max(1, int(workers))
+    check_cold = refit == 'best'
+    if workers == 1 or len(tiles) < PARALLEL_MIN_TILES:
+        fitted = [_forecast_tile(*t, days, check_cold) for t in tiles]
+    else:
+        if not chunk_size:
+            chunk_size = max(1, -(-len(tiles) // (workers * 4)))  # ~4 chunks per worker for load balance
+        chunks = [tiles[i:i + chunk_size] for i in range(0, len(tiles), chunk_size)]
+        fitted = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # map() yields in submission order, so the order matches the serial path
+            for part in pool.map(_forecast_chunk, chunks, [days] * len(chunks), [check_cold] * len(chunks)):
+                fitted.extend(part)
+    for s, (key, result, p) in zip(l_starts, fitted):
+        results[s] = (key, result)
+        params[s] = p
+
+    if cache is not None:
+        for s in np.r_[starts[short], starts[long_]].tolist():
+            i = np.searchsorted(starts, s)
+            n, c = lengths[i], complete[i]
+            key, result = results[s]
+            cache.put(key, {'n': int(n), 'complete': int(c),
+                            'digest': series_digest(wc[s:s + c], mass[s:s + c]),
+                            'tail': series_digest(wc[s + c:s + n], mass[s + c:s + n]),
+                            'result': result, 'params': params.get(s)})
+        cache.stats['warm'] += sum(1 for s in l_starts if s in warm)
+        cache.stats['cold'] += int(short.sum()) + len(l_starts) - cache.stats['warm']
+        cache.save()
+
+    # emit in tile order, independent of which path produced each forecast
+    return dict(results[s] for s in sorted(results))
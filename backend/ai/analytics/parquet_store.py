@@ -0,0 +1,483 @@
+"""Date-partitioned Parquet copy of telemetry.csv.
+
+Layout: data/telemetry_parquet/date=YYYY-MM-DD/*.parquet. The API's telemetry
+writer appends small part files per batch and compacts each touched partition
+into a single file once an hour. Analytics read through `read_telemetry`, which
+prunes partitions by date and loads only the requested columns.
+
+The CSV stays the source of truth. The _READY marker records how many bytes of
+it the store covers (and a fingerprint of its head); rows past that offset
+(written with the sink disabled, appended by hand, not yet mirrored) are read
+from the CSV tail, and a store whose fingerprint no longer matches (truncated or
+rewritten CSV) is ignored until it is rebuilt.
+
+The marker is also the manifest: it lists the part files holding exactly those
+bytes, and is replaced atomically. Readers load only the listed files, so a part
+written (or compacted) after they read the marker is never seen twice; files
+dropped from the manifest by compaction are deleted only after
+DELETE_GRACE_SECONDS, once readers holding the previous manifest are done.
+
+Usage:
+  python backend/ai/analytics/parquet_store.py --backfill
+  python backend/ai/analytics/parquet_store.py --compact
+"""
+import argparse
+import csv
+import datetime
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    from .telemetry_schema import CANONICAL_HEADER, COLUMN_TYPES, normalize_ts
+except ImportError:
+    from telemetry_schema import CANONICAL_HEADER, COLUMN_TYPES, normalize_ts
+
+BASE = Path(__file__).resolve().parents[2]
+CSV = BASE / "data" / "telemetry.csv"
+
+# marker written once the store holds the CSV history: {"csv_size", "head_sha1", "files"}
+READY_MARKER = "_READY"
+# how long part files replaced by compaction stay readable for in-flight readers
+DELETE_GRACE_SECONDS = 60.0
+TAIL_CHUNK_BYTES = 64 * 1024 * 1024
+HEAD_HASH_BYTES = 64 * 1024
+UNKNOWN_DATE = "unknown"
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+HEADER = CANONICAL_HEADER
+# text columns stay text when parsing the CSV; numeric ones are parsed natively
+# by read_csv (much faster than to_numeric on strings) and coerced afterwards
+CSV_DTYPES = {c: str for c, t in COLUMN_TYPES.items() if t != "float64"}
+
+
+def parquet_root_for(csv_path: Path) -> Path:
+    return Path(csv_path).parent / "telemetry_parquet"
+
+
+def coerce_types(df: pd.DataFrame) -> pd.DataFrame:
+    """Cast the canonical columns present in `df` to their storage types."""
+    for col in df.columns:
+        kind = COLUMN_TYPES.get(col)
+        if kind is None:
+            continue
+        if kind == "float64":
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+        elif kind.startswith("datetime"):
+            df[col] = parse_timestamps(df[col])
+        else:
+            # empty fields are missing values, as pandas reads them from the CSV
+            df[col] = df[col].astype("string").replace("", pd.NA)
+    return df
+
+
+def parse_timestamps(values: pd.Series) -> pd.Series:
+    """Parse the server's "YYYY-MM-DD HH:MM:SS" fast; only other formats take the slow path."""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    ts = pd.to_datetime(values, errors="coerce", format=TS_FORMAT)
+    retry = ts.isna() & values.notna() & (values.astype("string") != "")
+    if retry.any():
+        # other formats may carry an offset: normalise to naive UTC like the rest
+        ts[retry] = pd.to_datetime(values[retry], errors="coerce", format="mixed", utc=True).dt.tz_localize(None)
+    return ts
+
+
+def _partition_name(date) -> str:
+    if date is None or pd.isna(date):
+        return f"date={UNKNOWN_DATE}"
+    return f"date={date:%Y-%m-%d}"
+
+
+def _as_date(value):
+    if value is None:
+        return None
+    return pd.Timestamp(value).date()
+
+
+def _is_bare_date(value) -> bool:
+    if isinstance(value, datetime.date) and not isinstance(value, datetime.datetime):
+        return True
+    return isinstance(value, str) and len(value.strip()) <= 10
+
+
+def _end_bound(end) -> pd.Timestamp:
+    ts = pd.Timestamp(end)
+    if _is_bare_date(end):
+        # a bare date means "through the end of that day"
+        ts = ts + pd.Timedelta(days=1) - pd.Timedelta(microseconds=1)
+    return ts
+
+
+def _in_window(partition: str, start_d, end_d) -> bool:
+    label = partition.split("=", 1)[1]
+    if label == UNKNOWN_DATE:
+        return start_d is None and end_d is None
+    day = datetime.date.fromisoformat(label)
+    return (start_d is None or day >= start_d) and (end_d is None or day <= end_d)
+
+
+def list_partitions(root: Path, start=None, end=None):
+    """Partition directories whose date lies within [start, end] (inclusive days)."""
+    root = Path(root)
+    if not root.exists():
+        return []
+    start_d, end_d = _as_date(start), _as_date(end)
+    return [d for d in sorted(root.glob("date=*")) if _in_window(d.name, start_d, end_d)]
+
+
+def manifest_files(marker: dict, start=None, end=None):
+    """Part files (relative to the store root) listed in `marker` for the days in [start, end]."""
+    start_d, end_d = _as_date(start), _as_date(end)
+    return [f for f in marker["files"] if _in_window(f.split("/", 1)[0], start_d, end_d)]
+
+
+def head_hash(path: Path, upto: int) -> str:
+    """Fingerprint of the first `upto` bytes (capped) of a file, to detect a rewritten/migrated CSV."""
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read(min(upto, HEAD_HASH_BYTES))).hexdigest()
+
+
+def iter_csv_tail(path: Path, offset: int, end: int, chunk: int = TAIL_CHUNK_BYTES):
+    """Yield (block, next_offset) for bytes [offset, end), each block ending on a newline."""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        carry = b''
+        while offset + len(carry) < end:
+            data = carry + f.read(min(chunk, end - offset - len(carry)))
+            cut = data.rfind(b'\n') + 1
+            if cut == 0:
+                if len(data) == len(carry):
+                    return  # unterminated last line: leave it for the next run
+                carry = data
+                continue
+            offset += cut
+            carry = data[cut:]
+            yield data[:cut], offset
+
+
+def csv_header(path: Path):
+    """(header line length in bytes, parsed column names) of a CSV file."""
+    with open(path, 'rb') as f:
+        line = f.readline()
+    return len(line), next(csv.reader([line.decode('utf-8', errors='replace')]), [])
+
+
+def read_csv_range(path: Path, offset: int, end: int, header, columns=None):
+    """Typed frames for the complete rows in bytes [offset, end) of a CSV with `header`.
+
+    Yields (frame, next_offset); frames have `columns` (default: HEADER).
+    """
+    columns = list(columns) if columns is not None else HEADER
+    usecols = [c for c in columns if c in header]
+    dtypes = {c: t for c, t in CSV_DTYPES.items() if c in usecols}
+    for block, nxt in iter_csv_tail(path, offset, end):
+        df = pd.read_csv(io.BytesIO(block), names=header, header=None, usecols=usecols,
+                         dtype=dtypes, on_bad_lines="skip")
+        yield coerce_types(df).reindex(columns=columns), nxt
+
+
+def read_marker(root: Path):
+    try:
+        marker = json.loads((Path(root) / READY_MARKER).read_text())
+    except (OSError, ValueError):
+        return None
+    if (not isinstance(marker, dict) or not isinstance(marker.get("csv_size"), int)
+            or not isinstance(marker.get("files"), list)):
+        return None  # missing, or written by an older version without coverage info / manifest
+    return marker
+
+
+def _write_marker(root: Path, csv_path: Path, size: int, files):
+    tmp = Path(root) / (READY_MARKER + ".tmp")
+    tmp.write_text(json.dumps({"csv_size": size, "head_sha1": head_hash(csv_path, size), "files": sorted(files)}))
+    os.replace(tmp, Path(root) / READY_MARKER)
+
+
+def store_snapshot(csv_path: Path, root: Path):
+    """The marker (coverage + manifest) when the store matches the CSV, else None."""
+    marker = read_marker(root)
+    if marker is None:
+        return None
+    try:
+        size = Path(csv_path).stat().st_size
+    except OSError:
+        return None
+    covered = marker["csv_size"]
+    if covered > size or marker.get("head_sha1") != head_hash(csv_path, covered):
+        return None
+    return marker
+
+
+def csv_coverage(csv_path: Path, root: Path):
+    """Bytes of the CSV the store holds, or None when the store does not match the CSV."""
+    marker = store_snapshot(csv_path, root)
+    return None if marker is None else marker["csv_size"]
+
+
+def is_ready(root: Path) -> bool:
+    return read_marker(root) is not None
+
+
+def _read_snapshot(csv_path: Path, root: Path, marker: dict, need, start, end) -> pd.DataFrame:
+    # exactly the files in the manifest, plus the CSV bytes past the offset recorded with them
+    frames = [pd.read_parquet(root / f, columns=need) for f in manifest_files(marker, start, end)]
+    covered, size = marker["csv_size"], Path(csv_path).stat().st_size
+    if covered < size:
+        # rows the store has not mirrored yet
+        _, header = csv_header(csv_path)
+        frames.extend(df for df, _ in read_csv_range(csv_path, covered, size, header, need))
+    if frames:
+        return pd.concat(frames, ignore_index=True)
+    return pd.DataFrame({c: pd.Series(dtype=COLUMN_TYPES.get(c, "object")) for c in (need or HEADER)})
+
+
+def read_telemetry(csv_path: Path = CSV, columns=None, start=None, end=None, root: Path = None) -> pd.DataFrame:
+    """Load typed telemetry, reading only `columns` and the days in [start, end].
+
+    Uses the Parquet store next to `csv_path` when it matches the CSV, plus any
+    CSV rows appended past what it covers; otherwise parses the whole CSV (rows
+    outside the window are dropped after parsing).
+    """
+    root = parquet_root_for(csv_path) if root is None else Path(root)
+    # bounds with an offset (e.g. "...Z", "+05:30") become naive UTC like the stored timestamps
+    if start is not None:
+        start = normalize_ts(start)
+    if end is not None and not _is_bare_date(end):
+        end = normalize_ts(end)
+    cols = list(columns) if columns is not None else None
+    need = list(cols) if cols is not None else None
+    if need is not None and (start is not None or end is not None) and "timestamp_utc" not in need:
+        need.append("timestamp_utc")
+
+    df = None
+    for _ in range(3):
+        marker = store_snapshot(csv_path, root)
+        if marker is None:
+            break
+        try:
+            df = _read_snapshot(csv_path, root, marker, need, start, end)
+            break
+        except FileNotFoundError:
+            continue  # a rebuild (or a reader slower than the grace period) lost a file: re-read the marker
+    if df is None:
+        if not Path(csv_path).exists():
+            raise FileNotFoundError(f"No CSV at {csv_path}")
+        usecols = (lambda c: c in need) if need is not None else None
+        df = pd.read_csv(csv_path, usecols=usecols, dtype=CSV_DTYPES, on_bad_lines="skip")
+        df = coerce_types(df)
+
+    if start is not None:
+        df = df[df["timestamp_utc"] >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df["timestamp_utc"] <= _end_bound(end)]
+    if cols is not None:
+        df = df[cols]
+    return df.reset_index(drop=True)
+
+
+class ParquetSink:
+    """Telemetry writer sink that mirrors the CSV into Parquet partitions.
+
+    Each write ingests the CSV bytes past the marker's offset (so rows that
+    reached the CSV some other way are picked up too) and publishes a new
+    marker listing the new part files; touched partitions are compacted every
+    `compact_interval` seconds, and the files compaction replaced are deleted
+    `grace` seconds later. Building the store from scratch (first run, or a CSV
+    that no longer matches) runs on a background thread started by `start()`;
+    writes arriving meanwhile are skipped and caught up from the CSV
+    afterwards, so the writer thread never waits for a backfill.
+    """
+
+    def __init__(self, csv_path: Path = CSV, root: Path = None, compact_interval: float = 3600.0,
+                 grace: float = DELETE_GRACE_SECONDS):
+        import pyarrow  # noqa: F401  (fail early when the Parquet engine is missing)
+        self.csv_path = Path(csv_path)
+        self.root = parquet_root_for(csv_path) if root is None else Path(root)
+        self.compact_interval = compact_interval
+        self.grace = grace
+        self._dirty = set()
+        self._retired = []  # (delete after, [relative paths]) no longer in the manifest
+        self._last_compact = time.monotonic()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Bring the store up to date with the CSV on a background thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self.sync, name="parquet-backfill", daemon=True)
+        self._thread.start()
+
+    def write_rows(self, rows):
+        # the rows are already in the CSV; sync() reads them from there
+        if not self._lock.acquire(blocking=False):
+            return  # a backfill is running and will catch up afterwards
+        try:
+            if csv_coverage(self.csv_path, self.root) is None:
+                self.start()
+                return
+            self._sync_locked()
+        finally:
+            self._lock.release()
+
+    def sync(self):
+        with self._lock:
+            self._sync_locked()
+
+    def _sync_locked(self):
+        if not self.csv_path.exists():
+            return
+        marker = store_snapshot(self.csv_path, self.root)
+        if marker is None:
+            backfill(self.csv_path, self.root)
+            marker = store_snapshot(self.csv_path, self.root)
+        if marker is None:
+            return
+        covered, files = marker["csv_size"], list(marker["files"])
+        size = self.csv_path.stat().st_size
+        if covered < size:
+            _, header = csv_header(self.csv_path)
+            for df, covered in read_csv_range(self.csv_path, covered, size, header):
+                written = write_partitions(df, self.root)
+                files.extend(written)
+                self._dirty.update(f.split("/", 1)[0] for f in written)
+            _write_marker(self.root, self.csv_path, covered, files)
+        if time.monotonic() - self._last_compact >= self.compact_interval:
+            self._compact_dirty()
+        self._delete_retired()
+
+    def close(self):
+        with self._lock:
+            self._compact_dirty()
+            # shutting down: nothing would delete them later
+            self._delete_retired(force=True)
+
+    def _compact_dirty(self):
+        marker = store_snapshot(self.csv_path, self.root)
+        if marker is not None and self._dirty:
+            files, replaced = compact_manifest(self.root, marker["files"], self._dirty)
+            if replaced:
+                # publish the new manifest first; the inputs stay until readers of the old one are done
+                _write_marker(self.root, self.csv_path, marker["csv_size"], files)
+                self._retired.append((time.monotonic() + self.grace, replaced))
+        self._dirty.clear()
+        self._last_compact = time.monotonic()
+
+    def _delete_retired(self, force=False):
+        now = float("inf") if force else time.monotonic()
+        due = [files for deadline, files in self._retired if deadline <= now]
+        self._retired = [(deadline, files) for deadline, files in self._retired if deadline > now]
+        for files in due:
+            for f in files:
+                (self.root / f).unlink(missing_ok=True)
+
+
+def write_partitions(df: pd.DataFrame, root: Path):
+    """Write `df` as one new part file per date partition; returns the files (relative to `root`)."""
+    root = Path(root)
+    written = []
+    dates = df["timestamp_utc"].dt.date
+    for date, grp in df.groupby(dates.where(dates.notna(), None), dropna=False):
+        part = root / _partition_name(date)
+        part.mkdir(parents=True, exist_ok=True)
+        name = f"part-{time.time_ns()}.parquet"
+        grp.to_parquet(part / name, index=False)
+        written.append(f"{part.name}/{name}")
+    return written
+
+
+def compact_files(root: Path, files):
+    """Merge part files of one partition into a new timestamp-sorted file; returns its relative path.
+
+    The inputs are left in place: the caller deletes them once no reader can
+    still be using a manifest that lists them.
+    """
+    root = Path(root)
+    df = pd.concat([pd.read_parquet(root / f) for f in files], ignore_index=True)
+    df = df.sort_values("timestamp_utc", kind="stable")
+    part = root / files[0].split("/", 1)[0]
+    tmp = part / f".compacted-{time.time_ns()}.tmp"
+    df.to_parquet(tmp, index=False)
+    final = tmp.with_name(tmp.name[1:-4] + ".parquet")
+    os.replace(tmp, final)
+    return f"{part.name}/{final.name}"
+
+
+def compact_manifest(root: Path, files, partitions=None):
+    """Compact the listed files of `partitions` (default: all) that have more than one part.
+
+    Returns (new file list, replaced files).
+    """
+    by_part = {}
+    for f in files:
+        by_part.setdefault(f.split("/", 1)[0], []).append(f)
+    out, replaced = [], []
+    for part, group in sorted(by_part.items()):
+        if len(group) < 2 or (partitions is not None and part not in partitions):
+            out.extend(group)
+            continue
+        out.append(compact_files(root, sorted(group)))
+        replaced.extend(group)
+    return out, replaced
+
+
+def backfill(csv_path: Path = CSV, root: Path = None):
+    """(Re)build the Parquet store from the CSV as it is now.
+
+    Only the bytes present when the backfill starts are read; the marker
+    records that offset so later rows are picked up as the CSV tail.
+    """
+    root = parquet_root_for(csv_path) if root is None else Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    # without a marker readers use the CSV, so the old files can go right away
+    (root / READY_MARKER).unlink(missing_ok=True)
+    for old in root.glob("date=*/*.parquet"):
+        old.unlink()
+    files = []
+    covered = 0
+    if Path(csv_path).exists():
+        size = Path(csv_path).stat().st_size
+        covered, header = csv_header(csv_path)
+        for df, covered in read_csv_range(csv_path, covered, size, header):
+            files.extend(write_partitions(df, root))
+        files, replaced = compact_manifest(root, files)
+        for f in replaced:
+            (root / f).unlink()
+        _write_marker(root, csv_path, covered, files)
+    return root
+
+
+def compact_all(csv_path: Path = CSV, grace: float = DELETE_GRACE_SECONDS):
+    """Compact every partition of the store; the replaced files are deleted after `grace` seconds.
+
+    Meant for a stopped server: the API's sink also rewrites the marker.
+    """
+    root = parquet_root_for(csv_path)
+    marker = store_snapshot(csv_path, root)
+    if marker is None:
+        return
+    files, replaced = compact_manifest(root, marker["files"])
+    if not replaced:
+        return
+    _write_marker(root, csv_path, marker["csv_size"], files)
+    time.sleep(grace)
+    for f in replaced:
+        (root / f).unlink(missing_ok=True)
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description="Maintain the Parquet copy of telemetry.csv")
+    p.add_argument('--csv', default=str(CSV))
+    p.add_argument('--backfill', action='store_true', help='rebuild all partitions from the CSV')
+    p.add_argument('--compact', action='store_true', help='merge part files in every partition')
+    a = p.parse_args()
+    if a.backfill:
+        print('Backfilled', backfill(Path(a.csv)))
+    if a.compact:
+        compact_all(Path(a.csv))
@@ -0,0 +1,84 @@
+"""Canonical telemetry schema shared by the API, the storage backends and tools.
+
+CANONICAL_HEADER is the column order of telemetry.csv; COLUMN_TYPES gives the
+typed storage representation used by the Parquet and SQLite backends.
+normalize_ts turns user-supplied time bounds into the stored naive-UTC form.
+"""
+import datetime
+
+# Canonical CSV header required by spec
+CANONICAL_HEADER = [
+    "timestamp_utc",
+    "device_id",
+    "boat_id",
+    "lat",
+    "lon",
+    "heading_deg",
+    "mq135_ppm",
+    "mq2_ppm",
+    "soil_dry_belt_pct",
+    "soil_wet_belt_pct",
+    "loadcell_grams",
+    "tds_ppm",
+    "ultrasonic_cm",
+    "proximity_inductive",
+    "image_path",
+    "yolo_raw",
+    "waste_category",
+    "waste_subtype",
+    "collection_event",
+    "collection_bin_id",
+    "battery_volt",
+    "rssi",
+]
+
+# typed columns (pandas dtypes), in CANONICAL_HEADER order
+COLUMN_TYPES = {
+    "timestamp_utc": "datetime64[ns]",
+    "device_id": "string",
+    "boat_id": "string",
+    "lat": "float64",
+    "lon": "float64",
+    "heading_deg": "float64",
+    "mq135_ppm": "float64",
+    "mq2_ppm": "float64",
+    "soil_dry_belt_pct": "float64",
+    "soil_wet_belt_pct": "float64",
+    "loadcell_grams": "float64",
+    "tds_ppm": "float64",
+    "ultrasonic_cm": "float64",
+    "proximity_inductive": "float64",
+    "image_path": "string",
+    "yolo_raw": "string",
+    "waste_category": "string",
+    "waste_subtype": "string",
+    "collection_event": "string",
+    "collection_bin_id": "string",
+    "battery_volt": "float64",
+    "rssi": "float64",
+}
+
+NUMERIC_COLUMNS = [c for c, t in COLUMN_TYPES.items() if t == "float64"]
+
+# lat/lon rounding used for spatial tiles (same default as aggregate_daily.tile_key)
+TILE_PRECISION = 3
+
+
+def normalize_ts(value, end_of_day=False):
+    """Parse an ISO date/datetime into the stored "YYYY-MM-DD HH:MM:SS" (naive UTC) form.
+
+    Values with an offset are converted to UTC; a bare date means the start of
+    that day (or its last second with `end_of_day`). Raises ValueError for
+    anything that is not an ISO date or datetime.
+    """
+    s = str(value).strip()
+    try:
+        if len(s) == 10:
+            day = datetime.date.fromisoformat(s)
+            return f"{day:%Y-%m-%d} {'23:59:59' if end_of_day else '00:00:00'}"
+        ts = datetime.datetime.fromisoformat(s[:-1] + "+00:00" if s[-1:] in ("Z", "z") else s)
+    except ValueError:
+        raise ValueError(f"invalid timestamp {value!r}: expected an ISO date or datetime") from None
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return ts.strftime("%Y-%m-%d %H:%M:%S")
@@ -0,0 +1,140 @@
+# ai/api/batching.py
+# Dynamic micro-batching in front of the resident YOLO engine
+import threading
+import time
+from concurrent.futures import Future
+
+
+class Histogram:
+	"""Fixed-bucket histogram; each observation is counted in the first bucket >= value."""
+
+	def __init__(self, buckets):
+		self.buckets = sorted(buckets)
+		self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+		self.total = 0
+		self.sum = 0.0
+		self._lock = threading.Lock()
+
+	def observe(self, value):
+		with self._lock:
+			i = 0
+			while i < len(self.buckets) and value > self.buckets[i]:
+				i += 1
+			self.counts[i] += 1
+			self.total += 1
+			self.sum += value
+
+	def snapshot(self):
+		with self._lock:
+			return {
+				"buckets": {str(b): c for b, c in zip(self.buckets + ["+Inf"], self.counts)},
+				"count": self.total,
+				"sum": round(self.sum, 6),
+				"mean": round(self.sum / self.total, 6) if self.total else 0.0,
+			}
+
+
+class MicroBatcher:
+	"""Collects frames submitted within `window_ms` (up to `max_batch`) and runs
+	them as one batched `detect()` call on a dedicated thread.
+
+	`submit()` is thread-safe and returns a concurrent Future resolving to the
+	detections list for that frame; async callers wrap it with
+	`asyncio.wrap_future`.
+	"""
+
+	def __init__(self, detect_fn, window_ms=20, max_batch=8):
+		self.detect_fn = detect_fn
+		self.window = window_ms / 1000.0
+		self.max_batch = max(1, int(max_batch))
+		self.batch_sizes = Histogram([1, 2, 4, 8, 16, 32])
+		self.queue_wait_ms = Histogram([1, 5, 10, 20, 50, 100, 250, 500, 1000])
+		self._pending = []  # (source, future, enqueued_at)
+		self._cond = threading.Condition()
+		self._thread = None
+		self._stopped = False
+
+	def start(self):
+		with self._cond:
+			if self._thread is not None:
+				return
+			self._stopped = False
+			self._thread = threading.Thread(target=self._run, name="yolo-batcher", daemon=True)
+			self._thread.start()
+
+	def stop(self):
+		with self._cond:
+			self._stopped = True
+			self._cond.notify_all()
+			thread, self._thread = self._thread, None
+		if thread is not None:
+			thread.join()
+
+	def submit(self, source) -> Future:
+		fut = Future()
+		with self._cond:
+			if self._thread is None:
+				# not started (e.g. imported outside the app): run inline
+				inline = True
+			else:
+				inline = False
+				self._pending.append((source, fut, time.monotonic()))
+				self._cond.notify_all()
+		if inline:
+			self._run_batch([(source, fut, time.monotonic())])
+		return fut
+
+	def metrics(self):
+		return {
+			"window_ms": self.window * 1000.0,
+			"max_batch": self.max_batch,
+			"batch_size": self.batch_sizes.snapshot(),
+			"queue_wait_ms": self.queue_wait_ms.snapshot(),
+		}
+
+	def _next_batch(self):
+		with self._cond:
+			while not self._pending and not self._stopped:
+				self._cond.wait()
+			if not self._pending:
+				return None
+			# first frame opens the window; wait for more until full or expired
+			deadline = self._pending[0][2] + self.window
+			while len(self._pending) < self.max_batch and not self._stopped:
+				remaining = deadline - time.monotonic()
+				if remaining <= 0:
+					break
+				self._cond.wait(remaining)
+			batch = self._pending[:self.max_batch]
+			del self._pending[:self.max_batch]
+			return batch
+
+	def _run(self):
+		while True:
+			batch = self._next_batch()
+			if batch is None:
+				return
+			self._run_batch(batch)
+
+	def _run_batch(self, batch):
+		started = time.monotonic()
+		self.batch_sizes.observe(len(batch))
+		for _, _, enqueued in batch:
+			self.queue_wait_ms.observe((started - enqueued) * 1000.0)
+		try:
+			results = self.detect_fn([src for src, _, _ in batch])
+		except Exception as e:
+			for _, fut, _ in batch:
+				fut.set_exception(e)
+			return
+		if len(results) != len(batch):
+			err = RuntimeError(f"detect returned {len(results)} results for {len(batch)} frames")
+			for _, fut, _ in batch:
+				fut.set_exception(err)
+			return
+		for (_, fut, _), res in zip(batch, results):
+			if isinstance(res, Exception):
+				# per-frame failure (e.g. an undecodable upload); the rest of the batch is unaffected
+				fut.set_exception(res)
+			else:
+				fut.set_result(res)
@@ -0,0 +1,122 @@
+# ai/api/csv_export.py
+# Streaming, filtered export of telemetry.csv (CSV or NDJSON, optional gzip)
+import csv
+import hashlib
+import io
+import json
+import zlib
+from email.utils import formatdate, parsedate_to_datetime
+
+try:
+	from ..analytics.telemetry_schema import normalize_ts
+except ImportError:
+	from analytics.telemetry_schema import normalize_ts
+
+CHUNK_ROWS = 500
+
+
+def export_validators(stat, query: str):
+	"""(ETag, Last-Modified) for an export of the file in `stat` with these query params."""
+	key = hashlib.sha1(query.encode("utf-8")).hexdigest()[:12]
+	etag = f'W/"{stat.st_size:x}-{stat.st_mtime_ns:x}-{key}"'
+	return etag, formatdate(stat.st_mtime, usegmt=True)
+
+
+def not_modified(headers, etag: str, mtime: float) -> bool:
+	"""True when If-None-Match / If-Modified-Since show the client copy is current."""
+	inm = headers.get("if-none-match")
+	if inm is not None:
+		return any(t.strip() in (etag, "*") for t in inm.split(","))
+	ims = headers.get("if-modified-since")
+	if ims:
+		try:
+			return int(mtime) <= int(parsedate_to_datetime(ims).timestamp())
+		except (TypeError, ValueError):
+			return False
+	return False
+
+
+def _read_lines(path, limit):
+	# stop at the size the validators were computed for, so the body matches the ETag
+	read = 0
+	with open(path, "rb") as f:
+		for raw in f:
+			if read >= limit:
+				return
+			read += len(raw)
+			yield raw.decode("utf-8", errors="replace")
+
+
+def iter_rows(path, size, start=None, end=None, boat_id=None, device_id=None, columns=None):
+	"""Yield the (projected) header, then matching rows, reading the file incrementally.
+
+	Raises ValueError for unknown `columns` before anything is yielded.
+	"""
+	reader = csv.reader(_read_lines(path, size))
+	header = next(reader, None) or []
+	idx = {c: i for i, c in enumerate(header)}
+	cols = columns or header
+	unknown = [c for c in cols if c not in idx]
+	if unknown:
+		raise ValueError(f"unknown columns: {', '.join(unknown)}")
+	proj = [idx[c] for c in cols]
+	start_s = normalize_ts(start) if start else None
+	end_s = normalize_ts(end, end_of_day=True) if end else None
+	ts_i, boat_i, dev_i = idx.get("timestamp_utc"), idx.get("boat_id"), idx.get("device_id")
+
+	def field(row, i):
+		return row[i] if i is not None and i < len(row) else ""
+
+	def rows():
+		yield list(cols)
+		for row in reader:
+			if not row:
+				continue
+			if start_s or end_s:
+				ts = field(row, ts_i)[:19]
+				if (start_s and ts < start_s) or (end_s and ts > end_s):
+					continue
+			if boat_id and field(row, boat_i) != boat_id:
+				continue
+			if device_id and field(row, dev_i) != device_id:
+				continue
+			yield [field(row, i) for i in proj]
+
+	return rows()
+
+
+def iter_csv(rows):
+	buf = io.StringIO()
+	writer = csv.writer(buf)
+	n = 0
+	for row in rows:
+		writer.writerow(row)
+		n += 1
+		if n % CHUNK_ROWS == 0:
+			yield buf.getvalue()
+			buf.seek(0)
+			buf.truncate()
+	if buf.tell():
+		yield buf.getvalue()
+
+
+def iter_ndjson(rows):
+	rows = iter(rows)
+	header = next(rows, [])
+	lines = []
+	for row in rows:
+		lines.append(json.dumps(dict(zip(header, row))))
+		if len(lines) >= CHUNK_ROWS:
+			yield "\n".join(lines) + "\n"
+			lines = []
+	if lines:
+		yield "\n".join(lines) + "\n"
+
+
+def gzip_chunks(chunks):
+	comp = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+	for chunk in chunks:
+		data = comp.compress(chunk.encode("utf-8"))
+		if data:
+			yield data
+	yield comp.flush()
@@ -0,0 +1,170 @@
+# ai/api/detection_state.py
+# In-memory latest detection per device/boat, with change notification for long-poll/SSE
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_KEY = "default"
+# how often a change of the watched detected.txt is noticed
+WATCH_INTERVAL = 0.25
+
+
+def write_atomic(path: Path, text: str):
+	"""Replace `path` with `text` atomically (readers never see a partial file)."""
+	path = Path(path)
+	path.parent.mkdir(parents=True, exist_ok=True)
+	fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.", suffix=".tmp")
+	try:
+		with os.fdopen(fd, "w", encoding="utf-8") as f:
+			f.write(text)
+		os.replace(tmp, path)
+	except Exception:
+		try:
+			os.remove(tmp)
+		except OSError:
+			pass
+		raise
+
+
+class DetectionStore:
+	"""Latest detection payload per device/boat key with a global version counter.
+
+	`publish()` may be called from any thread. Async readers use `wait()` to
+	block until a version newer than `since` exists; they are woken through the
+	event loop. When `sink_path` is set every publish is also written there
+	atomically (for tools that read detected.txt).
+
+	`watch_path` is a detected.txt written by other processes (the webcam
+	scripts): whenever its mtime/size changes it is re-read and published as a
+	new version, so those writers reach /detected and its waiters too. The
+	check is one stat(), done at most every WATCH_INTERVAL seconds.
+
+	Versions start from the boot time in milliseconds, so they keep increasing
+	across restarts and a client resuming with an old version still gets the
+	next detection; a `since` newer than anything published (e.g. after the
+	clock moved back) is treated as stale and answered immediately.
+	"""
+
+	def __init__(self, sink_path=None, watch_path=None):
+		self.sink_path = Path(sink_path) if sink_path else None
+		self.watch_path = Path(watch_path) if watch_path else None
+		self.version = time.time_ns() // 1_000_000
+		self._latest = {}  # key -> (version, payload)
+		self._lock = threading.Lock()
+		self._loop = None
+		self._changed = None
+		self._watch_sig = None
+		self._watch_checked = 0.0
+		self._watch_lock = threading.Lock()
+
+	@staticmethod
+	def _signature(path):
+		try:
+			st = os.stat(path)
+		except OSError:
+			return None
+		return st.st_mtime_ns, st.st_size
+
+	def refresh(self, force=False) -> bool:
+		"""Publish the watched file if it changed since it was last seen; True when it did."""
+		if self.watch_path is None:
+			return False
+		now = time.monotonic()
+		if not force and now - self._watch_checked < WATCH_INTERVAL:
+			return False
+		with self._watch_lock:
+			self._watch_checked = now
+			sig = self._signature(self.watch_path)
+			if sig is None or sig == self._watch_sig:
+				return False
+			self._watch_sig = sig
+			try:
+				text = self.watch_path.read_text(encoding="utf-8").strip()
+			except OSError:
+				return False
+		if not text:
+			return False
+		payload = parse_detected(text)
+		self.publish(payload, key=payload.get("device_id") or payload.get("boat_id"), write_sink=False)
+		return True
+
+	def publish(self, payload: dict, key=None, write_sink=True) -> int:
+		with self._lock:
+			self.version += 1
+			version = self.version
+			self._latest[key or DEFAULT_KEY] = (version, dict(payload))
+		if write_sink and self.sink_path is not None:
+			try:
+				with self._watch_lock:
+					write_atomic(self.sink_path, json.dumps(payload))
+					if self.sink_path == self.watch_path:
+						# our own write: not an external change to re-publish
+						self._watch_sig = self._signature(self.sink_path)
+			except Exception:
+				pass
+		loop = self._loop
+		if loop is not None and not loop.is_closed():
+			loop.call_soon_threadsafe(self._wake)
+		return version
+
+	def get(self, key=None) -> dict:
+		"""Payload for `key` (without a key: the newest of any) plus its version.
+
+		A key nothing was published for gets the empty default, never another
+		device's detection.
+		"""
+		self.refresh()
+		with self._lock:
+			if key:
+				entry = self._latest.get(key)
+			else:
+				entry = max(self._latest.values(), key=lambda e: e[0]) if self._latest else None
+		if entry is None:
+			return {"prediction": "-", "version": 0}
+		version, payload = entry
+		return {**payload, "version": version}
+
+	def _wake(self):
+		# runs on the event loop: release everyone waiting on the current event
+		if self._changed is not None:
+			self._changed.set()
+		self._changed = asyncio.Event()
+
+	async def wait(self, since: int, key=None, timeout: float = 25.0) -> dict:
+		"""Return the current payload as soon as its version is greater than `since`,
+		or the unchanged payload after `timeout` seconds. A stale `since` (newer
+		than any version this store handed out) returns the current payload at once."""
+		loop = asyncio.get_running_loop()
+		if self._loop is not loop:
+			self._loop = loop
+			self._changed = asyncio.Event()
+		deadline = loop.time() + timeout
+		while True:
+			changed = self._changed
+			cur = self.get(key)
+			if cur["version"] > since or since > self.version:
+				return cur
+			remaining = deadline - loop.time()
+			if remaining <= 0:
+				return cur
+			try:
+				# wake periodically to notice external writes to the watched file
+				timeout_step = remaining if self.watch_path is None else min(remaining, WATCH_INTERVAL)
+				await asyncio.wait_for(changed.wait(), timeout_step)
+			except asyncio.TimeoutError:
+				pass
+
+
+def parse_detected(text: str) -> dict:
+	"""detected.txt holds either the JSON payload or a bare `label:conf` string."""
+	try:
+		obj = json.loads(text)
+		if isinstance(obj, dict):
+			return obj
+	except Exception:
+		pass
+	return {"prediction": text}
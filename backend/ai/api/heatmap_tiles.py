@@ -0,0 +1,146 @@
+# ai/api/heatmap_tiles.py
+# Multi-resolution pre-aggregated heatmap cells (tile pyramid), kept current by the telemetry writer
+import threading
+
+import numpy as np
+
+try:
+	from ..analytics.aggregate_daily import category_weight, category_weights
+	from ..analytics.parquet_store import read_telemetry
+	from ..analytics.telemetry_schema import CANONICAL_HEADER
+except ImportError:
+	from analytics.aggregate_daily import category_weight, category_weights
+	from analytics.parquet_store import read_telemetry
+	from analytics.telemetry_schema import CANONICAL_HEADER
+
+# decimal places of lat/lon per level: ~11 km, ~1.1 km, ~110 m, ~11 m cells
+PYRAMID_PRECISIONS = (1, 2, 3, 4)
+# a query never returns more cells than this; it falls back to a coarser level
+MAX_CELLS = 20000
+_LAT, _LON, _CAT = (CANONICAL_HEADER.index(c) for c in ("lat", "lon", "waste_category"))
+# cells are stored under one int64: (row + _BIAS) * _STRIDE + (col + _BIAS)
+_STRIDE = 1 << 31
+_BIAS = 1 << 30
+
+
+def _cell_key(la, lo):
+	return (la + _BIAS) * _STRIDE + (lo + _BIAS)
+
+
+def precision_for_zoom(zoom: int) -> int:
+	"""Decimal places whose cells are a few screen pixels wide at a web-map zoom level."""
+	# a 256 px web-map tile spans 360 / 2**zoom degrees; aim for ~8 px cells
+	cell = 360.0 / 2 ** max(0, int(zoom)) / 32
+	return max(0, int(np.ceil(-np.log10(cell))))
+
+
+class TilePyramid:
+	"""Weighted point counts rounded to several lat/lon precisions.
+
+	Each level maps the integer cell (round(lat * 10**p), round(lon * 10**p)),
+	packed into one int, to (count, weight): the same rounding `tile_key` uses
+	and the same category weights as the heatmap. Fed as a TelemetryWriter sink
+	(`write_rows`) after a one-time `backfill`, so a query costs O(cells in the
+	box), not O(points). Cells are replaced, never mutated, so a query copies
+	what it needs under the lock and filters it after releasing it.
+	"""
+
+	def __init__(self, precisions=PYRAMID_PRECISIONS):
+		self.precisions = tuple(sorted(precisions))
+		self.version = 0
+		self._levels = {p: {} for p in self.precisions}
+		self._lock = threading.Lock()
+
+	def add_points(self, lat, lon, weight):
+		lat = np.asarray(lat, dtype=np.float64)
+		lon = np.asarray(lon, dtype=np.float64)
+		weight = np.asarray(weight, dtype=np.float64)
+		ok = np.isfinite(lat) & np.isfinite(lon)
+		lat, lon, weight = lat[ok], lon[ok], weight[ok]
+		if not len(lat):
+			return
+		updates = {}
+		for p in self.precisions:
+			scale = 10 ** p
+			keys = _cell_key(np.round(lat * scale).astype(np.int64), np.round(lon * scale).astype(np.int64))
+			uniq, inv = np.unique(keys, return_inverse=True)
+			counts = np.bincount(inv, minlength=len(uniq))
+			weights = np.bincount(inv, weights=weight, minlength=len(uniq))
+			updates[p] = (uniq.tolist(), counts.tolist(), weights.tolist())
+		with self._lock:
+			for p, (keys, counts, weights) in updates.items():
+				level = self._levels[p]
+				if not level:
+					level.update(zip(keys, zip(counts, weights)))
+					continue
+				for key, c, w in zip(keys, counts, weights):
+					cell = level.get(key)
+					level[key] = (c, w) if cell is None else (cell[0] + c, cell[1] + w)
+			self.version += 1
+
+	def write_rows(self, rows):
+		lat, lon, w = [], [], []
+		for r in rows:
+			if len(r) != len(CANONICAL_HEADER):
+				continue
+			try:
+				la, lo = float(r[_LAT]), float(r[_LON])
+			except (TypeError, ValueError):
+				continue
+			lat.append(la)
+			lon.append(lo)
+			w.append(category_weight(r[_CAT]))
+		self.add_points(lat, lon, w)
+
+	def backfill(self, csv_path):
+		"""Load the existing history (Parquet store when ready, else the CSV); returns points added."""
+		try:
+			df = read_telemetry(csv_path, columns=["lat", "lon", "waste_category"])
+		except FileNotFoundError:
+			return 0
+		self.add_points(df["lat"].to_numpy(), df["lon"].to_numpy(), category_weights(df["waste_category"]))
+		return len(df)
+
+	def _level_at_most(self, precision):
+		finer = [p for p in self.precisions if p <= precision]
+		return finer[-1] if finer else self.precisions[0]
+
+	def query(self, min_lat, min_lon, max_lat, max_lon, zoom=None, precision=None, max_cells=MAX_CELLS):
+		"""Cells of one level inside the box as {precision, cell_size, version, cells}.
+
+		The level is `precision` if given, else the one matching `zoom`; it is
+		coarsened while the box would hold more than `max_cells` cells. Each cell
+		is [lat, lon, count, weight] at the cell centre.
+		"""
+		if precision is None:
+			precision = precision_for_zoom(zoom) if zoom is not None else self.precisions[-1]
+		idx = self.precisions.index(self._level_at_most(precision))
+		with self._lock:
+			while True:
+				p = self.precisions[idx]
+				scale = 10 ** p
+				la0, la1 = int(np.floor(min_lat * scale)), int(np.ceil(max_lat * scale))
+				lo0, lo1 = int(np.floor(min_lon * scale)), int(np.ceil(max_lon * scale))
+				span = (la1 - la0 + 1) * (lo1 - lo0 + 1)
+				level = self._levels[p]
+				if idx == 0 or min(span, len(level)) <= max_cells:
+					break
+				idx -= 1
+			# snapshot only: the ingest path waits on this lock
+			if span < len(level):
+				# small box on a big level: probe the box's cells instead of copying the level
+				la, lo = np.meshgrid(np.arange(la0, la1 + 1), np.arange(lo0, lo1 + 1), indexing="ij")
+				keys = _cell_key(la.ravel(), lo.ravel()).tolist()
+				snapshot = [(k, v) for k, v in zip(keys, map(level.get, keys)) if v is not None]
+			else:
+				snapshot = list(level.items())
+			version = self.version
+		found = []
+		for key, v in snapshot:
+			la, lo = key // _STRIDE - _BIAS, key % _STRIDE - _BIAS
+			if la0 <= la <= la1 and lo0 <= lo <= lo1:
+				found.append((la, lo, v))
+				if len(found) >= max_cells:
+					break
+		cells = [[round(la / scale, p), round(lo / scale, p), v[0], v[1]] for la, lo, v in found]
+		return {"precision": p, "cell_size": 1 / scale, "version": version, "cells": cells}
@@ -1,47 +1,80 @@
 # ai/api/main.py
-from fastapi import FastAPI, File, Form, UploadFile
-from fastapi.responses import JSONResponse, FileResponse
-import uvicorn, os, csv, datetime, json, subprocess, sys, tempfile, base64
+from fastapi import FastAPI, File, Form, Request, UploadFile
+from fastapi.responses import JSONResponse, FileResponse, Response, StreamingResponse
+import uvicorn, os, csv, datetime, json, sys, tempfile, base64, asyncio
 from pathlib import Path
 from typing import Optional
 import requests
 
 ROOT = Path(__file__).resolve().parents[1]  # ai/
+
+# works both as `backend.ai.api.main` and as `api.main` with ai/ as the app dir
+try:
+	from ..yolo.yolo_inference import YoloEngine, format_detections
+	from ..yolo.utils_yolo import classify_label
+	from .batching import MicroBatcher
+	from .workers import BoundedExecutor, QueueFull, SingleFlight
+	from .telemetry_writer import TelemetryWriter
+	from .sqlite_store import SqliteTelemetryStore
+	from . import csv_export
+	from .detection_state import DetectionStore, parse_detected, write_atomic
+	from .heatmap_tiles import TilePyramid
+	from .report_jobs import ReportJobs
+	from ..analytics.telemetry_schema import CANONICAL_HEADER, normalize_ts
+except ImportError:
+	sys.path.insert(0, str(ROOT))
+	from yolo.yolo_inference import YoloEngine, format_detections
+	from yolo.utils_yolo import classify_label
+	from api.batching import MicroBatcher
+	from api.workers import BoundedExecutor, QueueFull, SingleFlight
+	from api.telemetry_writer import TelemetryWriter
+	from api.sqlite_store import SqliteTelemetryStore
+	from api import csv_export
+	from api.detection_state import DetectionStore, parse_detected, write_atomic
+	from api.heatmap_tiles import TilePyramid
+	from api.report_jobs import ReportJobs
+	from analytics.telemetry_schema import CANONICAL_HEADER, normalize_ts
+
 DATA_DIR = ROOT.parent / "data"
 IMG_DIR = DATA_DIR / "images"
 CSV_FILE = DATA_DIR / "telemetry.csv"
-DETECTED_FILE = ROOT / "yolo" / "detected.txt"  # post_webcam_demo writes this
+SQLITE_FILE = Path(os.environ.get("TELEMETRY_SQLITE_PATH", str(DATA_DIR / "telemetry.db")))
+DETECTED_FILE = ROOT / "yolo" / "detected.txt"  # also written by realtime_yolo_taco.py / post_webcam_demo.py; reloaded on change
+HEATMAP_FILE = DATA_DIR / "heatmap.html"
+HEATMAP_VERSION_FILE = DATA_DIR / "heatmap.html.version"  # telemetry version it was built from
+
+# micro-batching window for concurrent frames (tune with GET /metrics/batching)
+BATCH_WINDOW_MS = float(os.environ.get("BATCH_WINDOW_MS", "20"))
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", "8"))
+INFERENCE_TIMEOUT = 30
+# bounded worker pool for the image pipelines; requests beyond workers + queue get 429
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", str(BATCH_MAX_SIZE)))
+IMAGE_QUEUE_SIZE = int(os.environ.get("IMAGE_QUEUE_SIZE", "16"))
+IMAGE_RETRY_AFTER = 1  # seconds
+# telemetry.csv writer: batch thresholds and fsync policy ("none", "batch", "interval")
+TELEMETRY_MAX_BATCH = int(os.environ.get("TELEMETRY_MAX_BATCH", "256"))
+TELEMETRY_FLUSH_INTERVAL = float(os.environ.get("TELEMETRY_FLUSH_INTERVAL", "0.5"))
+TELEMETRY_FSYNC = os.environ.get("TELEMETRY_FSYNC", "batch")
+# mirror telemetry into date-partitioned Parquet for the analytics jobs (needs pyarrow)
+TELEMETRY_PARQUET = os.environ.get("TELEMETRY_PARQUET", "1") == "1"
+# optional SQLite backend serving GET /telemetry/query (off unless TELEMETRY_SQLITE=1)
+TELEMETRY_SQLITE = os.environ.get("TELEMETRY_SQLITE", "0") == "1"
+# also mirror the latest detection into detected.txt (written atomically)
+DETECTED_FILE_SINK = os.environ.get("DETECTED_FILE_SINK", "1") == "1"
+DETECTED_LONGPOLL_MAX = 60  # seconds
+# in-memory multi-resolution heatmap cells behind GET /heatmap/tiles
+HEATMAP_TILES = os.environ.get("HEATMAP_TILES", "1") == "1"
+# PDF reports requested through POST /reports (built in separate processes)
+REPORTS_DIR = DATA_DIR / "reports"
+REPORT_WORKERS = int(os.environ.get("REPORT_WORKERS", "1"))
+# finished reports kept on disk: at most REPORT_MAX_KEEP, none older than REPORT_TTL seconds (0 = no limit)
+REPORT_MAX_KEEP = int(os.environ.get("REPORT_MAX_KEEP", "200"))
+REPORT_TTL = float(os.environ.get("REPORT_TTL", str(7 * 86400)))
 
 # ensure directories
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 IMG_DIR.mkdir(parents=True, exist_ok=True)
 
-# Canonical CSV header required by spec
-CANONICAL_HEADER = [
-	"timestamp_utc",
-	"device_id",
-	"boat_id",
-	"lat",
-	"lon",
-	"heading_deg",
-	"mq135_ppm",
-	"mq2_ppm",
-	"soil_dry_belt_pct",
-	"soil_wet_belt_pct",
-	"loadcell_grams",
-	"tds_ppm",
-	"ultrasonic_cm",
-	"proximity_inductive",
-	"image_path",
-	"yolo_raw",
-	"waste_category",
-	"waste_subtype",
-	"collection_event",
-	"collection_bin_id",
-	"battery_volt",
-	"rssi",
-]
-
 if not CSV_FILE.exists():
 	with open(CSV_FILE, "w", newline="") as f:
 		writer = csv.writer(f)
@@ -49,10 +82,46 @@ if not CSV_FILE.exists():
 
 app = FastAPI(title="Waste Segregation API")
 
+sqlite_store = SqliteTelemetryStore(SQLITE_FILE, csv_path=CSV_FILE) if TELEMETRY_SQLITE else None
+tile_pyramid = TilePyramid() if HEATMAP_TILES else None
+
+def make_parquet_sink():
+	try:
+		try:
+			from ..analytics.parquet_store import ParquetSink
+		except ImportError:
+			from analytics.parquet_store import ParquetSink
+		return ParquetSink(CSV_FILE)
+	except ImportError as e:
+		print(f"Parquet telemetry store disabled: {e}", file=sys.stderr)
+		return None
+
+parquet_sink = make_parquet_sink() if TELEMETRY_PARQUET else None
+
+def build_telemetry_sinks():
+	"""Secondary stores fed by the telemetry writer after each CSV batch."""
+	sinks = []
+	if sqlite_store is not None:
+		sinks.append(sqlite_store)
+	if tile_pyramid is not None:
+		sinks.append(tile_pyramid)
+	if parquet_sink is not None:
+		sinks.append(parquet_sink)
+	return sinks
+
+# single owner of telemetry.csv; handlers only enqueue rows
+telemetry_writer = TelemetryWriter(
+	CSV_FILE,
+	CANONICAL_HEADER,
+	max_batch=TELEMETRY_MAX_BATCH,
+	flush_interval=TELEMETRY_FLUSH_INTERVAL,
+	fsync=TELEMETRY_FSYNC,
+	sinks=build_telemetry_sinks(),
+)
+
 def append_row(row):
 	# row is expected to be a list matching CANONICAL_HEADER length
-	with open(CSV_FILE, "a", newline="") as f:
-		csv.writer(f).writerow(row)
+	telemetry_writer.append(row)
 
 
 def classify_waste_and_hazard_from_label(label: str, conf: float = 0.0, conf_threshold: float = 0.25):
@@ -95,6 +164,50 @@ def get_model_path():
 	# if not found, return default name (ultralytics may download)
 	return "yolov8n.pt"
 
+# latest detection per device/boat, served from memory by /detected
+detections = DetectionStore(DETECTED_FILE if DETECTED_FILE_SINK else None, watch_path=DETECTED_FILE)
+detections.refresh(force=True)
+
+# resident model shared by /image, /image_url and /image_base64
+engine = YoloEngine(get_model_path())
+# frames arriving together are run as one batched predict call
+batcher = MicroBatcher(engine.detect, window_ms=BATCH_WINDOW_MS, max_batch=BATCH_MAX_SIZE)
+image_pool = BoundedExecutor(IMAGE_WORKERS, IMAGE_QUEUE_SIZE, name="image")
+
+
+@app.on_event("startup")
+def load_engine():
+	# load the weights once so each request only pays for the forward pass
+	engine.load()
+	batcher.start()
+	if sqlite_store is not None:
+		# import the CSV rows appended since the last run (all of them the first time)
+		sqlite_store.sync_from_csv()
+	if tile_pyramid is not None:
+		tile_pyramid.backfill(CSV_FILE)
+	if parquet_sink is not None:
+		# (re)build / catch up the Parquet copy off the writer thread
+		parquet_sink.start()
+	telemetry_writer.start()
+
+
+@app.on_event("shutdown")
+def stop_engine():
+	image_pool.shutdown()
+	report_jobs.shutdown()
+	batcher.stop()
+	# drain buffered rows so nothing is lost on shutdown
+	telemetry_writer.close()
+
+
+def run_inference(image_path) -> str:
+	"""Return the top prediction as `label:conf`, or "-" when nothing was found."""
+	try:
+		return format_detections(batcher.submit(str(image_path)).result(timeout=INFERENCE_TIMEOUT))
+	except Exception:
+		return "-"
+
+
 @app.post("/telemetry")
 async def telemetry(json_payload: dict):
 	"""
@@ -115,7 +228,6 @@ async def telemetry(json_payload: dict):
 	waste_subtype = "-"
 	if isinstance(raw, str) and raw != "-":
 		try:
-			from ..yolo.utils_yolo import classify_label
 			cat, subtype = classify_label(raw.split(":")[0])
 			waste_category = cat if cat != "unknown" else raw
 			waste_subtype = subtype
@@ -170,6 +282,23 @@ async def telemetry(json_payload: dict):
 	append_row(row)
 	return JSONResponse({"status":"ok"})
 
+async def run_in_image_pool(fn, *args):
+	"""Run an image pipeline on the bounded worker pool.
+
+	Keeps blocking file I/O and inference off the event loop; answers 429 with
+	Retry-After when the pool and its queue are full.
+	"""
+	try:
+		fut = image_pool.submit(fn, *args)
+	except QueueFull:
+		return JSONResponse(
+			{"status": "error", "error": "image queue full, retry later"},
+			status_code=429,
+			headers={"Retry-After": str(IMAGE_RETRY_AFTER)},
+		)
+	return await asyncio.wrap_future(fut)
+
+
 @app.post("/image")
 async def image(
 	lat: Optional[str] = Form(None),
@@ -177,28 +306,20 @@ async def image(
 	sensors: Optional[str] = Form("{}"),
 	image: UploadFile = File(...)
 ):
+	contents = await image.read()
+	return await run_in_image_pool(process_image, contents, lat, lon, sensors)
+
+
+def process_image(contents: bytes, lat: Optional[str], lon: Optional[str], sensors: Optional[str]):
+	"""/image pipeline (save, infer, classify, append); runs on the worker pool."""
 	# Save image
 	ts_fname = datetime.datetime.utcnow().strftime("%Y%m%d_%H%M%S_%f")
 	out_path = IMG_DIR / f"{ts_fname}.jpg"
-	contents = await image.read()
 	with open(out_path, "wb") as fw:
 		fw.write(contents)
 
-	# Run inference (call the local CLI-style script)
-	model = get_model_path()
-	pred = "-"
-	try:
-		proc = subprocess.run([
-			sys.executable,
-			str(ROOT / "yolo" / "inference_yolov8.py"),
-			"--image",
-			str(out_path),
-			"--model",
-			model,
-		], capture_output=True, text=True, timeout=30)
-		pred = proc.stdout.strip() or "-"
-	except Exception:
-		pred = "-"
+	# Run inference on the resident model (batched with concurrent frames)
+	pred = run_inference(out_path)
 
 	# Map pred to category & subtype
 	waste_label = "-"
@@ -206,11 +327,7 @@ async def image(
 	if pred and pred != "-":
 		parts = pred.split(":")
 		raw_label = parts[0]
-		try:
-			from .yolo.utils_yolo import classify_label as classify_local
-		except Exception:
-			from ..yolo.utils_yolo import classify_label as classify_local
-		cat, subtype = classify_local(raw_label)
+		cat, subtype = classify_label(raw_label)
 		waste_label = cat if cat != "unknown" else raw_label
 		waste_type = subtype
 
@@ -254,8 +371,8 @@ async def image(
 	]
 	append_row(row)
 
-	# also write detected.txt for ESP8266 to read (raw_label:confidence)
-	# write JSON payload so ESP/ESP32 can parse waste_state/hazard easily
+	# publish the latest detection for ESP8266 polling (raw_label:confidence)
+	# as a JSON payload so ESP/ESP32 can parse waste_state/hazard easily
 	raw_for_esp = pred if pred and pred != "-" else waste_label
 	detected_payload = {
 		"prediction": raw_for_esp,
@@ -263,11 +380,7 @@ async def image(
 		"hazard": int(hazard),
 		"hazard_type": hazard_type,
 	}
-	try:
-		with open(DETECTED_FILE, "w", encoding="utf-8") as f:
-			f.write(json.dumps(detected_payload))
-	except Exception:
-		pass
+	detections.publish(detected_payload, key=sget("device_id") or sget("boat_id") or None)
 
 	# Return structured info so clients can use category/subtype directly
 	return JSONResponse({
@@ -284,12 +397,16 @@ async def image(
 
 
 @app.post("/image_base64")
-def image_base64(payload: dict):
+async def image_base64(payload: dict):
 	"""Accept base64 image string for ESP32-CAM posts."""
 	image_b64 = payload.get("imageBase64")
 	sensors = payload.get("sensors", {})
 	if not image_b64:
 		return JSONResponse({"status": "error", "error": "imageBase64 required"}, status_code=400)
+	return await run_in_image_pool(process_image_base64, image_b64, sensors)
+
+
+def process_image_base64(image_b64: str, sensors: dict):
 	try:
 		raw = base64.b64decode(image_b64.split(",")[-1])
 		with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp:
@@ -298,16 +415,21 @@ def image_base64(payload: dict):
 	except Exception as e:
 		return JSONResponse({"status": "error", "error": f"decode failed: {e}"}, status_code=500)
 
-	return image_url({"imageUrl": None, "sensors": sensors, "tmp_path": str(tmp_path)})
+	return process_image_url(None, sensors, tmp_path)
 
 
 @app.post("/image_url")
-def image_url(payload: dict):
+async def image_url(payload: dict):
 	image_url = payload.get("imageUrl")
 	tmp_override = payload.get("tmp_path")
 	sensors = payload.get("sensors", {})
 	if not image_url and not tmp_override:
 		return JSONResponse({"status": "error", "error": "imageUrl required"}, status_code=400)
+	return await run_in_image_pool(process_image_url, image_url, sensors, tmp_override)
+
+
+def process_image_url(image_url: Optional[str], sensors: dict, tmp_override=None):
+	"""/image_url pipeline (download, infer, classify, append); runs on the worker pool."""
 	try:
 		if tmp_override:
 			tmp_path = Path(tmp_override)
@@ -320,29 +442,12 @@ def image_url(payload: dict):
 	except Exception as e:
 		return JSONResponse({"status": "error", "error": f"download failed: {e}"}, status_code=500)
 
-	model = get_model_path()
-	pred = "-"
+	pred = run_inference(tmp_path)
 	raw_label = "-"
-	try:
-		proc = subprocess.run([
-			sys.executable,
-			str(ROOT / "yolo" / "inference_yolov8.py"),
-			"--image",
-			str(tmp_path),
-			"--model",
-			model,
-		], capture_output=True, text=True, timeout=30)
-		pred = proc.stdout.strip() or "-"
-	except Exception:
-		pred = "-"
 	if pred and pred != "-":
 		raw_label = pred.split(":")[0]
 
-	try:
-		from .yolo.utils_yolo import classify_label as classify_local
-	except Exception:
-		from ..yolo.utils_yolo import classify_label as classify_local
-	waste_label, waste_type = classify_local(raw_label) if raw_label else ("unknown", "")
+	waste_label, waste_type = classify_label(raw_label) if raw_label else ("unknown", "")
 	waste_state, hazard, hazard_type = classify_waste_and_hazard_from_label(raw_label)
 
 	# write telemetry row
@@ -373,49 +478,226 @@ def image_url(payload: dict):
 		"hazard_type": hazard_type,
 	})
 
+@app.get("/metrics/batching")
+def batching_metrics():
+	"""Batch size and queue-wait histograms for tuning BATCH_WINDOW_MS / BATCH_MAX_SIZE,
+	plus the engine's actual forward-pass count."""
+	return {**batcher.metrics(), "engine": engine.stats(), "image_pool": image_pool.stats()}
+
 @app.get("/detected")
-def get_detected():
-	# returns last detected string for ESP to poll
-	try:
-		if DETECTED_FILE.exists():
-			s = DETECTED_FILE.read_text().strip()
-			# try to parse JSON payload written by /image or realtime script
-			try:
-				obj = json.loads(s)
-				return obj
-			except Exception:
-				return {"prediction": s}
-	except Exception:
-		pass
-	return {"prediction": "-"}
+async def get_detected(
+	since: Optional[int] = None,
+	device_id: Optional[str] = None,
+	boat_id: Optional[str] = None,
+	timeout: float = 25.0,
+):
+	"""Latest detection for ESP polling, served from memory with its `version`.
+	With `since=<version>` this long-polls: it answers as soon as a newer
+	detection exists, or with the unchanged payload after `timeout` seconds.
+	"""
+	key = device_id or boat_id
+	if since is None:
+		return detections.get(key)
+	return await detections.wait(since, key, min(max(timeout, 0.0), DETECTED_LONGPOLL_MAX))
+
+
+@app.get("/detected/stream")
+async def detected_stream(
+	request: Request,
+	since: int = 0,
+	device_id: Optional[str] = None,
+	boat_id: Optional[str] = None,
+):
+	"""Server-Sent Events feed of detections (`id:` is the version; resumes from Last-Event-ID)."""
+	key = device_id or boat_id
+	last_id = request.headers.get("last-event-id")
+	if last_id and last_id.isdigit():
+		since = int(last_id)
+
+	async def events():
+		version = since
+		while not await request.is_disconnected():
+			cur = await detections.wait(version, key, timeout=15)
+			# != rather than >: a Last-Event-ID from before a restart may be ahead of us
+			if cur["version"] != version:
+				version = cur["version"]
+				yield f"id: {version}\nevent: detection\ndata: {json.dumps(cur)}\n\n"
+			else:
+				yield ": keepalive\n\n"
+
+	return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 
 @app.post("/set_detected")
 def set_detected(payload: dict):
-	"""Dev-only: set the backend detected value (writes `detected.txt`).
+	"""Dev-only: set the backend detected value (also mirrored to `detected.txt`).
 	POST JSON: {"value":"plastic:0.88"}
 	"""
 	try:
 		v = payload.get("value", "-")
-		os.makedirs(os.path.dirname(DETECTED_FILE), exist_ok=True)
-		with open(DETECTED_FILE, "w") as f:
-			f.write(str(v))
+		detections.publish(parse_detected(str(v)), key=payload.get("device_id") or payload.get("boat_id"))
 		return JSONResponse({"status":"ok","written": v})
 	except Exception as e:
 		return JSONResponse({"status":"error","error": str(e)}, status_code=500)
 
 @app.get("/csv")
-def get_csv():
-	if CSV_FILE.exists():
-		return FileResponse(str(CSV_FILE))
-	return JSONResponse({"error":"no csv"}, status_code=404)
+def get_csv(
+	request: Request,
+	start: Optional[str] = None,
+	end: Optional[str] = None,
+	boat_id: Optional[str] = None,
+	device_id: Optional[str] = None,
+	columns: Optional[str] = None,
+	format: str = "csv",
+	gzip: bool = False,
+):
+	"""Stream telemetry.csv, optionally filtered and projected.
+	Example: /csv?start=2025-11-21&end=2025-11-22&boat_id=boat1&columns=timestamp_utc,lat,lon&format=ndjson
+	Responses carry ETag / Last-Modified; a matching If-None-Match or
+	If-Modified-Since gets 304. Gzip is used with `gzip=true` or Accept-Encoding: gzip.
+	"""
+	# make rows still sitting in the writer buffer part of the download
+	telemetry_writer.flush(timeout=5)
+	if not CSV_FILE.exists():
+		return JSONResponse({"error":"no csv"}, status_code=404)
+	if format not in ("csv", "ndjson"):
+		return JSONResponse({"error": "format must be csv or ndjson"}, status_code=400)
+
+	st = CSV_FILE.stat()
+	etag, last_modified = csv_export.export_validators(st, str(request.url.query))
+	headers = {"ETag": etag, "Last-Modified": last_modified, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+	if csv_export.not_modified(request.headers, etag, st.st_mtime):
+		return Response(status_code=304, headers=headers)
+
+	cols = [c.strip() for c in columns.split(",") if c.strip()] if columns else None
+	try:
+		rows = csv_export.iter_rows(CSV_FILE, st.st_size, start, end, boat_id, device_id, cols)
+	except ValueError as e:
+		return JSONResponse({"error": str(e)}, status_code=400)
+	body = csv_export.iter_ndjson(rows) if format == "ndjson" else csv_export.iter_csv(rows)
+	if gzip or "gzip" in request.headers.get("accept-encoding", ""):
+		body = csv_export.gzip_chunks(body)
+		headers["Content-Encoding"] = "gzip"
+	media_type = "application/x-ndjson" if format == "ndjson" else "text/csv"
+	return StreamingResponse(body, media_type=media_type, headers=headers)
+
+@app.get("/telemetry/query")
+def telemetry_query(
+	start: Optional[str] = None,
+	end: Optional[str] = None,
+	boat_id: Optional[str] = None,
+	device_id: Optional[str] = None,
+	tile: Optional[str] = None,
+	columns: Optional[str] = None,
+	limit: int = 1000,
+	offset: int = 0,
+):
+	"""Time-range / boat / device / tile filtered telemetry from the SQLite backend.
+	Example: /telemetry/query?boat_id=boat1&start=2025-11-21&end=2025-11-22&columns=timestamp_utc,lat,lon
+	`tile` is the rounded "lat_lon" key (e.g. 22.573_88.364).
+	"""
+	if sqlite_store is None:
+		return JSONResponse({"error": "sqlite backend disabled (set TELEMETRY_SQLITE=1)"}, status_code=404)
+	# rows still buffered in the writer become visible once flushed
+	telemetry_writer.flush(timeout=5)
+	cols = [c.strip() for c in columns.split(",") if c.strip()] if columns else None
+	try:
+		rows = sqlite_store.query(start, end, boat_id, device_id, tile, cols, min(max(limit, 1), 10000), max(offset, 0))
+	except ValueError as e:
+		return JSONResponse({"error": str(e)}, status_code=400)
+	return {"count": len(rows), "rows": rows}
+
+heatmap_flight = SingleFlight()
+
+def telemetry_version() -> str:
+	# changes whenever rows are appended to (or the file is replaced under) telemetry.csv
+	st = CSV_FILE.stat()
+	return f"{st.st_size:x}-{st.st_mtime_ns:x}"
+
+def heatmap_built_version():
+	try:
+		return HEATMAP_VERSION_FILE.read_text(encoding="utf-8").strip()
+	except OSError:
+		return None
+
+def build_heatmap(version):
+	# a request that queued behind the previous build may find this version already done
+	if HEATMAP_FILE.exists() and heatmap_built_version() == version:
+		return HEATMAP_FILE
+	try:
+		from ..yolo.generate_heatmap import save_heatmap
+	except ImportError:
+		from yolo.generate_heatmap import save_heatmap
+	out = save_heatmap(out=HEATMAP_FILE, snapshot=False)
+	if out is not None:
+		write_atomic(HEATMAP_VERSION_FILE, version)
+	return out
 
 @app.get("/heatmap")
 def heatmap():
-	out = DATA_DIR / "heatmap.html"
-	if out.exists():
-		return FileResponse(str(out))
-	return JSONResponse({"error":"heatmap not generated yet"}, status_code=404)
+	"""Serve heatmap.html, rebuilding it first if telemetry changed since the last build."""
+	telemetry_writer.flush(timeout=5)
+	version = telemetry_version()
+	if not (HEATMAP_FILE.exists() and heatmap_built_version() == version):
+		try:
+			# concurrent requests share one rebuild
+			heatmap_flight.do("heatmap", build_heatmap, version)
+		except Exception as e:
+			if not HEATMAP_FILE.exists():
+				return JSONResponse({"error": f"heatmap build failed: {e}"}, status_code=500)
+			print(f"heatmap rebuild failed, serving previous build: {e}", file=sys.stderr)
+	if HEATMAP_FILE.exists():
+		return FileResponse(str(HEATMAP_FILE))
+	return JSONResponse({"error": "no telemetry to plot yet"}, status_code=404)
+
+
+@app.get("/heatmap/tiles")
+def heatmap_tiles(
+	bbox: str,
+	zoom: Optional[int] = None,
+	precision: Optional[int] = None,
+):
+	"""Pre-aggregated heat cells inside bbox=min_lon,min_lat,max_lon,max_lat at the level for `zoom`."""
+	if tile_pyramid is None:
+		return JSONResponse({"error": "heatmap tiles disabled (HEATMAP_TILES=0)"}, status_code=404)
+	try:
+		min_lon, min_lat, max_lon, max_lat = (float(v) for v in bbox.split(","))
+	except ValueError:
+		return JSONResponse({"error": "bbox must be min_lon,min_lat,max_lon,max_lat"}, status_code=400)
+	if min_lat > max_lat or min_lon > max_lon:
+		return JSONResponse({"error": "bbox min must not exceed max"}, status_code=400)
+	return tile_pyramid.query(min_lat, min_lon, max_lat, max_lon, zoom=zoom, precision=precision)
+
+report_jobs = ReportJobs(REPORTS_DIR, telemetry_version, max_workers=REPORT_WORKERS, max_reports=REPORT_MAX_KEEP, ttl=REPORT_TTL)
+
+@app.post("/reports")
+def create_report(payload: dict):
+	"""Queue a PDF report for {start, end, boat_id} (all optional); poll GET /reports/{id}."""
+	start, end = payload.get("start") or None, payload.get("end") or None
+	try:
+		# naive UTC like the stored timestamps; "...Z" / "+05:30" are converted
+		start = normalize_ts(start) if start else None
+		end = normalize_ts(end, end_of_day=True) if end else None
+	except ValueError as e:
+		return JSONResponse({"error": str(e)}, status_code=400)
+	telemetry_writer.flush(timeout=5)
+	job = report_jobs.submit(start=start, end=end, boat_id=payload.get("boat_id") or None)
+	job["url"] = f"/reports/{job['id']}"
+	return JSONResponse(job, status_code=200 if job["status"] == "done" else 202)
+
+
+@app.get("/reports/{job_id}")
+def get_report(job_id: str):
+	if not (len(job_id) == 16 and all(ch in "0123456789abcdef" for ch in job_id)):
+		return JSONResponse({"error": "unknown report"}, status_code=404)
+	job = report_jobs.get(job_id)
+	if job is None:
+		return JSONResponse({"error": "unknown report"}, status_code=404)
+	if job["status"] == "done":
+		return FileResponse(str(report_jobs.path_for(job_id)), media_type="application/pdf", filename=f"report_{job_id}.pdf")
+	if job["status"] == "failed":
+		return JSONResponse(job, status_code=500)
+	return JSONResponse(job, status_code=202)
 
 
 @app.get("/telemetry_get")
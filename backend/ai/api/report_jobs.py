@@ -0,0 +1,143 @@
+# ai/api/report_jobs.py
+# Background PDF report jobs on a process pool, cached by (parameters, data version)
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+# PDFs written by ReportJobs (batch reports in the same directory are left alone)
+JOB_PDF = re.compile(r"report_[0-9a-f]{16}\.pdf")
+
+
+def _run_report(start, end, boat_id, out):
+	# runs in a worker process; the report stack (matplotlib, reportlab) is only loaded there
+	try:
+		from ..reports.generate_pdf_report import build_pdf
+	except ImportError:
+		from reports.generate_pdf_report import build_pdf
+	out = Path(out)
+	tmp = out.with_name(f".{out.name}.tmp")
+	build_pdf(start=start, end=end, boat_id=boat_id, out=tmp)
+	os.replace(tmp, out)  # a finished PDF appears atomically
+	return str(out)
+
+
+class ReportJobs:
+	"""Queue of report builds keyed by their parameters and the telemetry version.
+
+	The job id is a hash of (params, data version), so identical requests
+	against unchanged data share one job, and a PDF built earlier (even before
+	a restart) is served without rebuilding. Jobs run in a small process pool,
+	away from the request handlers.
+
+	Since every telemetry change yields new ids, finished jobs and their PDFs
+	are pruned on each submit: anything finished more than `ttl` seconds ago
+	(0 = no limit) and, beyond that, all but the newest `max_reports`.
+	"""
+
+	def __init__(self, out_dir, version_fn, max_workers=1, max_reports=200, ttl=7 * 86400):
+		self.out_dir = Path(out_dir)
+		self.version_fn = version_fn
+		self.max_workers = max(1, int(max_workers))
+		self.max_reports = max(1, int(max_reports))
+		self.ttl = float(ttl)
+		self._jobs = {}
+		self._lock = threading.Lock()
+		self._pool = None
+
+	def _executor(self):
+		if self._pool is None:
+			# spawn: the server process has live threads (batcher, writer), which fork would copy mid-flight
+			self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+		return self._pool
+
+	def path_for(self, job_id) -> Path:
+		return self.out_dir / f"report_{job_id}.pdf"
+
+	def submit(self, start=None, end=None, boat_id=None) -> dict:
+		params = {"start": start, "end": end, "boat_id": boat_id}
+		version = self.version_fn()
+		job_id = hashlib.sha1(json.dumps([params, version], sort_keys=True).encode("utf-8")).hexdigest()[:16]
+		with self._lock:
+			self._prune_locked()
+			job = self._jobs.get(job_id)
+			if job is not None and job["status"] != "failed":
+				return self._public(job)
+			job = {"id": job_id, "status": "queued", "params": params, "data_version": version,
+				"submitted": time.time(), "finished": None, "error": None}
+			self._jobs[job_id] = job
+			if self.path_for(job_id).exists():
+				job.update(status="done", finished=job["submitted"])
+				return self._public(job)
+		self.out_dir.mkdir(parents=True, exist_ok=True)
+		args = (start, end, boat_id, str(self.path_for(job_id)))
+		try:
+			fut = self._executor().submit(_run_report, *args)
+		except BrokenProcessPool:
+			# a worker died (e.g. OOM); start a fresh pool rather than failing every later job
+			self._pool = None
+			fut = self._executor().submit(_run_report, *args)
+		with self._lock:
+			if job["status"] == "queued":
+				job["status"] = "running"
+		fut.add_done_callback(lambda f, jid=job_id: self._finished(jid, f))
+		return self._public(job)
+
+	def _finished(self, job_id, fut):
+		with self._lock:
+			job = self._jobs[job_id]
+			job["finished"] = time.time()
+			err = fut.exception() if not fut.cancelled() else "cancelled"
+			if err is None:
+				job["status"] = "done"
+			else:
+				job["status"], job["error"] = "failed", str(err)
+
+	def _prune_locked(self):
+		# finished jobs (in memory or PDFs left by an earlier run), newest first
+		finished = {jid: job["finished"] for jid, job in self._jobs.items() if job["finished"] is not None}
+		try:
+			for f in self.out_dir.iterdir():
+				if JOB_PDF.fullmatch(f.name):
+					jid = f.name[len("report_"):-len(".pdf")]
+					job = self._jobs.get(jid)
+					if job is None or job["finished"] is not None:
+						finished.setdefault(jid, f.stat().st_mtime)
+		except OSError:
+			pass  # no reports yet
+		cutoff = time.time() - self.ttl if self.ttl > 0 else None
+		for rank, (jid, when) in enumerate(sorted(finished.items(), key=lambda kv: kv[1], reverse=True)):
+			if rank < self.max_reports and (cutoff is None or when >= cutoff):
+				continue
+			self._jobs.pop(jid, None)
+			try:
+				self.path_for(jid).unlink()
+			except FileNotFoundError:
+				pass
+			except OSError as e:
+				print(f"report jobs: could not remove {self.path_for(jid)}: {e}", file=sys.stderr)
+
+	def get(self, job_id) -> dict:
+		"""Job status, or None for an unknown id (a PDF left by an earlier run counts as done)."""
+		with self._lock:
+			job = self._jobs.get(job_id)
+			if job is not None:
+				return self._public(job)
+		if self.path_for(job_id).exists():
+			return {"id": job_id, "status": "done"}
+		return None
+
+	@staticmethod
+	def _public(job):
+		return {k: v for k, v in job.items() if v is not None}
+
+	def shutdown(self):
+		if self._pool is not None:
+			self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,174 @@
+# ai/api/sqlite_store.py
+# Optional SQLite (WAL) telemetry backend with indexed time/boat/device/tile queries
+import csv
+import io
+import sqlite3
+import threading
+from pathlib import Path
+
+try:
+	from ..analytics.parquet_store import csv_header, head_hash, iter_csv_tail
+	from ..analytics.telemetry_schema import CANONICAL_HEADER, COLUMN_TYPES, TILE_PRECISION, normalize_ts
+except ImportError:
+	from analytics.parquet_store import csv_header, head_hash, iter_csv_tail
+	from analytics.telemetry_schema import CANONICAL_HEADER, COLUMN_TYPES, TILE_PRECISION, normalize_ts
+
+SQL_TYPES = {"float64": "REAL", "string": "TEXT", "datetime64[ns]": "TEXT"}
+TILE_COLUMNS = ["tile_lat", "tile_lon", "tile_key"]
+ALL_COLUMNS = CANONICAL_HEADER + TILE_COLUMNS
+# CSV bytes imported per transaction when catching up
+SYNC_CHUNK_BYTES = 1024 * 1024
+
+
+def _to_float(v):
+	try:
+		return float(v) if v not in (None, "") else None
+	except (TypeError, ValueError):
+		return None
+
+
+def tile_of(lat, lon, precision=TILE_PRECISION):
+	"""Return (tile_lat, tile_lon, tile_key) for a position, or Nones when unknown."""
+	lat, lon = _to_float(lat), _to_float(lon)
+	if lat is None or lon is None:
+		return None, None, None
+	tlat, tlon = round(lat, precision), round(lon, precision)
+	return tlat, tlon, f"{tlat}_{tlon}"
+
+
+class SqliteTelemetryStore:
+	"""Typed telemetry table in a WAL-mode SQLite database.
+
+	Used as a TelemetryWriter sink (`write_rows`). With `csv_path` the table
+	mirrors telemetry.csv by byte offset, like the Parquet store: the meta table
+	records how many bytes of the CSV are imported plus a hash of its head, and
+	every sync (at startup and on each sink batch) imports the rows past that
+	offset. Rows that reached the CSV while the backend was off, or from another
+	writer, are therefore caught up too; a truncated or rewritten CSV is
+	re-imported from scratch. Timestamps are stored as the CSV's sortable
+	"YYYY-MM-DD HH:MM:SS" text; `tile_key` is the rounded "lat_lon" of the row.
+	Reads use one connection per thread so they never wait on the writer.
+	"""
+
+	def __init__(self, path, tile_precision=TILE_PRECISION, csv_path=None):
+		self.path = Path(path)
+		self.csv_path = Path(csv_path) if csv_path else None
+		self.tile_precision = tile_precision
+		self._local = threading.local()
+		self._write_lock = threading.Lock()
+		conn = self._conn()
+		conn.execute("PRAGMA journal_mode=WAL")
+		cols = ", ".join(f"{c} {SQL_TYPES[COLUMN_TYPES[c]]}" for c in CANONICAL_HEADER)
+		conn.executescript(f"""
+			CREATE TABLE IF NOT EXISTS telemetry (
+				id INTEGER PRIMARY KEY AUTOINCREMENT,
+				{cols},
+				tile_lat REAL,
+				tile_lon REAL,
+				tile_key TEXT
+			);
+			CREATE INDEX IF NOT EXISTS idx_telemetry_ts ON telemetry (timestamp_utc);
+			CREATE INDEX IF NOT EXISTS idx_telemetry_boat_ts ON telemetry (boat_id, timestamp_utc);
+			CREATE INDEX IF NOT EXISTS idx_telemetry_device_ts ON telemetry (device_id, timestamp_utc);
+			CREATE INDEX IF NOT EXISTS idx_telemetry_tile_ts ON telemetry (tile_key, timestamp_utc);
+			CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+		""")
+
+	def _conn(self):
+		conn = getattr(self._local, "conn", None)
+		if conn is None:
+			conn = sqlite3.connect(str(self.path), check_same_thread=False)
+			conn.execute("PRAGMA synchronous=NORMAL")
+			conn.row_factory = sqlite3.Row
+			self._local.conn = conn
+		return conn
+
+	def _typed(self, row):
+		out = []
+		for col, v in zip(CANONICAL_HEADER, row):
+			if COLUMN_TYPES[col] == "float64":
+				out.append(_to_float(v))
+			else:
+				out.append(None if v in (None, "") else str(v))
+		d = dict(zip(CANONICAL_HEADER, row))
+		out.extend(tile_of(d.get("lat"), d.get("lon"), self.tile_precision))
+		return out
+
+	def _insert(self, conn, rows):
+		placeholders = ", ".join("?" for _ in ALL_COLUMNS)
+		sql = f"INSERT INTO telemetry ({', '.join(ALL_COLUMNS)}) VALUES ({placeholders})"
+		conn.executemany(sql, [self._typed(r) for r in rows if len(r) == len(CANONICAL_HEADER)])
+
+	def write_rows(self, rows):
+		if self.csv_path is not None:
+			# the rows are already in the CSV; import them (and anything else new) from there
+			self.sync_from_csv()
+			return
+		with self._write_lock:
+			conn = self._conn()
+			with conn:
+				self._insert(conn, rows)
+
+	def _meta(self, conn, key):
+		row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+		return row[0] if row else None
+
+	def sync_from_csv(self):
+		"""Import the CSV rows past the recorded offset; returns rows imported.
+
+		Each chunk commits together with the new offset, so an import
+		interrupted by a crash resumes after the last committed chunk instead
+		of inserting rows again.
+		"""
+		if self.csv_path is None or not self.csv_path.exists():
+			return 0
+		n = 0
+		with self._write_lock:
+			conn = self._conn()
+			size = self.csv_path.stat().st_size
+			offset = self._meta(conn, "csv_offset")
+			offset = int(offset) if offset is not None else None
+			if offset is None or offset > size or self._meta(conn, "csv_head_sha1") != head_hash(self.csv_path, offset):
+				# first import, a CSV truncated/rewritten since, or a database from the one-shot backfill
+				with conn:
+					conn.execute("DELETE FROM telemetry")
+					conn.execute("DELETE FROM meta WHERE key IN ('backfilled', 'backfill_progress', 'csv_offset', 'csv_head_sha1')")
+				offset, _ = csv_header(self.csv_path)
+			for block, offset in iter_csv_tail(self.csv_path, offset, size, SYNC_CHUNK_BYTES):
+				rows = list(csv.reader(io.StringIO(block.decode("utf-8", errors="replace"))))
+				with conn:
+					self._insert(conn, rows)  # malformed legacy rows are skipped
+					conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [
+						("csv_offset", str(offset)), ("csv_head_sha1", head_hash(self.csv_path, offset))])
+				n += sum(1 for r in rows if len(r) == len(CANONICAL_HEADER))
+		return n
+
+	def query(self, start=None, end=None, boat_id=None, device_id=None, tile=None, columns=None, limit=1000, offset=0):
+		"""Rows matching the filters, oldest first. `columns` restricts the output."""
+		cols = [c for c in (columns or CANONICAL_HEADER) if c in ALL_COLUMNS]
+		if not cols:
+			raise ValueError("no valid columns requested")
+		where, params = [], []
+		if start:
+			where.append("timestamp_utc >= ?")
+			params.append(normalize_ts(start))
+		if end:
+			where.append("timestamp_utc <= ?")
+			params.append(normalize_ts(end, end_of_day=True))
+		for col, val in (("boat_id", boat_id), ("device_id", device_id), ("tile_key", tile)):
+			if val:
+				where.append(f"{col} = ?")
+				params.append(val)
+		sql = f"SELECT {', '.join(cols)} FROM telemetry"
+		if where:
+			sql += " WHERE " + " AND ".join(where)
+		sql += " ORDER BY timestamp_utc, id LIMIT ? OFFSET ?"
+		params.extend([int(limit), int(offset)])
+		return [dict(r) for r in self._conn().execute(sql, params)]
+
+	def close(self):
+		conn = getattr(self._local, "conn", None)
+		if conn is not None:
+			conn.close()
+			self._local.conn = None
+
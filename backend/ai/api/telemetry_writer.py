@@ -0,0 +1,192 @@
+# ai/api/telemetry_writer.py
+# Single-writer, batched appender for telemetry.csv
+import csv
+import io
+import os
+import queue
+import sys
+import threading
+import time
+
+FSYNC_POLICIES = ("none", "batch", "interval")
+
+
+class _Flush:
+	"""Queue marker: the writer sets `done` once everything before it is on disk."""
+
+	def __init__(self):
+		self.done = threading.Event()
+
+
+_STOP = object()
+
+
+class TelemetryWriter:
+	"""Owns telemetry.csv and appends rows from an in-memory queue.
+
+	Handlers call `append(row)` from any thread; one writer thread keeps the file
+	open and writes rows in batches, flushing when `max_batch` rows are buffered
+	or `flush_interval` seconds after the first buffered row. Each batch is a
+	single write() of whole rows, so rows can never interleave or tear.
+
+	Extra `sinks` (objects with `write_rows(rows)` and optional `close()`) get
+	every batch after it is in the CSV; a failing sink is logged and skipped.
+	Once `close()` has been called the writer stays closed: later appends are
+	dropped with a log message instead of starting a new thread, until
+	start() is called again.
+
+	fsync policy:
+	- "none": flush to the OS only, let it decide when to hit the disk
+	- "batch": fsync after every batch (default, safest)
+	- "interval": fsync at most once every `fsync_interval` seconds
+	"""
+
+	def __init__(self, path, header, max_batch=256, flush_interval=0.5, fsync="batch", fsync_interval=5.0, sinks=None):
+		if fsync not in FSYNC_POLICIES:
+			raise ValueError(f"fsync must be one of {FSYNC_POLICIES}, got {fsync!r}")
+		self.path = path
+		self.header = list(header)
+		self.max_batch = max(1, int(max_batch))
+		self.flush_interval = float(flush_interval)
+		self.fsync = fsync
+		self.fsync_interval = float(fsync_interval)
+		self.sinks = list(sinks or [])
+		self.rows_written = 0
+		self.rows_dropped = 0
+		self._queue = queue.Queue()
+		self._thread = None
+		self._lock = threading.Lock()
+		self._file = None
+		self._last_fsync = 0.0
+		self._closed = False
+
+	def start(self):
+		"""Start (or, after close(), explicitly restart) the writer thread."""
+		with self._lock:
+			self._closed = False
+			self._start_locked()
+
+	def _start_locked(self):
+		if self._closed or (self._thread is not None and self._thread.is_alive()):
+			return
+		self._thread = threading.Thread(target=self._run, name="telemetry-writer", daemon=True)
+		self._thread.start()
+
+	def append(self, row):
+		"""Queue one row; returns False (row dropped) once the writer is closed."""
+		if len(row) != len(self.header):
+			raise ValueError(f"telemetry row has {len(row)} fields, expected {len(self.header)}")
+		with self._lock:
+			if self._closed:
+				self.rows_dropped += 1
+				print("telemetry writer: closed, dropping row", file=sys.stderr)
+				return False
+			# queued under the lock so no row can land behind close()'s stop marker
+			self._queue.put(list(row))
+			self._start_locked()
+		return True
+
+	def flush(self, timeout=None):
+		"""Block until every row appended before this call has been written."""
+		if self._thread is None or not self._thread.is_alive():
+			return True
+		marker = _Flush()
+		self._queue.put(marker)
+		return marker.done.wait(timeout)
+
+	def close(self, timeout=None):
+		"""Drain the queue, write remaining rows and stop the writer thread."""
+		with self._lock:
+			self._closed = True
+			thread, self._thread = self._thread, None
+			if thread is None or not thread.is_alive():
+				return
+			self._queue.put(_STOP)
+		thread.join(timeout)
+
+	def _open(self):
+		if self._file is None:
+			self._file = open(self.path, "a", newline="", encoding="utf-8")
+			if self._file.tell() == 0:
+				self._write_batch([self.header])
+
+	def _write_batch(self, rows):
+		buf = io.StringIO()
+		csv.writer(buf).writerows(rows)
+		self._file.write(buf.getvalue())
+		self._file.flush()
+		if self.fsync == "batch" or (
+			self.fsync == "interval" and time.monotonic() - self._last_fsync >= self.fsync_interval
+		):
+			os.fsync(self._file.fileno())
+			self._last_fsync = time.monotonic()
+
+	def _flush_rows(self, rows):
+		"""Write `rows`; on I/O errors keep them (returns False) so they are retried."""
+		if not rows:
+			return True
+		try:
+			self._open()
+			self._write_batch(rows)
+		except OSError as e:
+			print(f"telemetry writer: write failed, will retry: {e}", file=sys.stderr)
+			self._close_file()
+			return False
+		self.rows_written += len(rows)
+		for sink in self.sinks:
+			try:
+				sink.write_rows(rows)
+			except Exception as e:
+				print(f"telemetry writer: sink {type(sink).__name__} failed: {e}", file=sys.stderr)
+		return True
+
+	def _close_file(self):
+		if self._file is None:
+			return
+		try:
+			if self.fsync != "none":
+				os.fsync(self._file.fileno())
+			self._file.close()
+		except OSError:
+			pass
+		self._file = None
+
+	def _run(self):
+		pending = []
+		deadline = None
+		try:
+			while True:
+				timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+				try:
+					item = self._queue.get(timeout=timeout)
+				except queue.Empty:
+					item = None
+
+				if item is _STOP:
+					self._flush_rows(pending)
+					return
+				if isinstance(item, _Flush):
+					if self._flush_rows(pending):
+						pending, deadline = [], None
+					item.done.set()
+					continue
+				if item is not None:
+					pending.append(item)
+					if deadline is None:
+						deadline = time.monotonic() + self.flush_interval
+
+				if len(pending) >= self.max_batch or (deadline is not None and time.monotonic() >= deadline):
+					if self._flush_rows(pending):
+						pending, deadline = [], None
+					else:
+						deadline = time.monotonic() + self.flush_interval
+		finally:
+			self._close_file()
+			for sink in self.sinks:
+				close = getattr(sink, "close", None)
+				if close is None:
+					continue
+				try:
+					close()
+				except Exception as e:
+					print(f"telemetry writer: closing sink {type(sink).__name__} failed: {e}", file=sys.stderr)
@@ -0,0 +1,87 @@
+# ai/api/workers.py
+# Bounded thread pool with non-blocking admission (backpressure for the image endpoints)
+# and single-flight deduplication of concurrent rebuilds
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class QueueFull(Exception):
+	"""Raised by BoundedExecutor.submit when every worker and queue slot is taken."""
+
+
+class BoundedExecutor:
+	"""ThreadPoolExecutor that admits at most `max_workers + max_queue` tasks.
+
+	`submit()` never blocks the caller: when no slot is free it raises QueueFull
+	so the endpoint can answer 429 instead of piling up work.
+	"""
+
+	def __init__(self, max_workers, max_queue, name="worker"):
+		self.max_workers = max(1, int(max_workers))
+		self.max_queue = max(0, int(max_queue))
+		self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+		self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+		self._lock = threading.Lock()
+		self._in_flight = 0
+		self._rejected = 0
+
+	def submit(self, fn, *args, **kwargs):
+		if not self._slots.acquire(blocking=False):
+			with self._lock:
+				self._rejected += 1
+			raise QueueFull()
+		with self._lock:
+			self._in_flight += 1
+		try:
+			fut = self._pool.submit(fn, *args, **kwargs)
+		except Exception:
+			self._release(None)
+			raise
+		fut.add_done_callback(self._release)
+		return fut
+
+	def _release(self, _fut):
+		with self._lock:
+			self._in_flight -= 1
+		self._slots.release()
+
+	def stats(self):
+		with self._lock:
+			return {
+				"workers": self.max_workers,
+				"queue_size": self.max_queue,
+				"in_flight": self._in_flight,
+				"rejected": self._rejected,
+			}
+
+	def shutdown(self, wait=True):
+		self._pool.shutdown(wait=wait)
+
+
+class SingleFlight:
+	"""Collapse concurrent calls with the same key into one execution.
+
+	The first caller for a key runs `fn`; callers arriving while it is running
+	wait for it and get the same result (or exception). Once it finishes the
+	next call for that key runs again.
+	"""
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._calls = {}
+
+	def do(self, key, fn, *args, **kwargs):
+		with self._lock:
+			fut = self._calls.get(key)
+			leader = fut is None
+			if leader:
+				fut = self._calls[key] = Future()
+		if leader:
+			try:
+				fut.set_result(fn(*args, **kwargs))
+			except BaseException as e:
+				fut.set_exception(e)
+			finally:
+				with self._lock:
+					del self._calls[key]
+		return fut.result()
@@ -1,82 +1,138 @@
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg')  # file output only; also safe in worker processes without a display
 import matplotlib.pyplot as plt
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
 from reportlab.lib.utils import ImageReader
 import io
 import logging
+import os
+import re
+import sys
+
+try:
+    from ..analytics.parquet_store import read_telemetry
+    from ..yolo.generate_heatmap import HEAT_COLUMNS, prepare_heat_data, render_heatmap_png
+except ImportError:
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+    from analytics.parquet_store import read_telemetry
+    from yolo.generate_heatmap import HEAT_COLUMNS, prepare_heat_data, render_heatmap_png
 
 logger = logging.getLogger("report")
 
 BASE = Path(__file__).resolve().parents[2]
 CSV = BASE / "data" / "telemetry.csv"
-HEATMAP_PNG = BASE / "data" / "heatmap_snapshot.png"
 OUT_PDF = BASE / "data" / "report_latest.pdf"
+REPORTS_DIR = BASE / "data" / "reports"
 PRESENTATION = Path("/mnt/data/SIH2025-IDEA-Presentation25014.pdf")
+REPORT_COLUMNS = ['timestamp_utc', 'waste_subtype', 'loadcell_grams', 'tds_ppm']
+PIE_DAYS = 7  # composition pie: the last week of data in the report window
+
+
+def load_report_frame(start=None, end=None, boat_id=None, csv_path: Path = CSV, with_boat=False) -> pd.DataFrame:
+    """Typed report + heat columns for the days in [start, end] (optionally one boat)."""
+    cols = REPORT_COLUMNS + [c for c in HEAT_COLUMNS if c not in REPORT_COLUMNS]
+    if boat_id or with_boat:
+        cols.append('boat_id')
+    df = read_telemetry(csv_path, columns=cols, start=start, end=end)
+    if boat_id:
+        df = df[df['boat_id'] == boat_id]
+    return df
+
+
+def prepare_report_data(start=None, end=None, boat_id=None, csv_path: Path = CSV) -> dict:
+    """Load the report columns once and compute everything the charts need."""
+    return summarize(load_report_frame(start, end, boat_id, csv_path))
+
+
+def summarize(df: pd.DataFrame) -> dict:
+    """Chart inputs for a loaded report frame.
+
+    The composition pie covers the last PIE_DAYS days of data in the frame.
+    """
+    ts = df['timestamp_utc']
+    recent = ts >= ts.max() - pd.Timedelta(days=PIE_DAYS)  # all False when there are no timestamps
+    dated = df[ts.notna()]
+    tds = df['tds_ppm']
+    return {
+        'rows': len(df),
+        'start': ts.min(),
+        'end': ts.max(),
+        'subtype_counts': df.loc[recent, 'waste_subtype'].fillna('unknown').value_counts(),
+        'daily_mass': dated['loadcell_grams'].groupby(dated['timestamp_utc'].dt.date).sum(),
+        'tds': pd.Series(tds[tds.notna()].to_numpy(), index=ts[tds.notna()]),
+        'heat': prepare_heat_data(df),
+    }
+
+
+def _png(fig) -> bytes:
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', bbox_inches='tight')
+    plt.close(fig)
+    return buf.getvalue()
 
 
-def _plot_pie(df: pd.DataFrame) -> bytes:
-    last7 = df[pd.to_datetime(df['timestamp_utc']) >= (pd.Timestamp.utcnow() - pd.Timedelta(days=7))]
-    counts = last7['waste_subtype'].fillna('unknown').value_counts()
+def _plot_pie(counts: pd.Series) -> bytes:
     fig, ax = plt.subplots(figsize=(6,4))
-    counts.plot.pie(ax=ax, autopct='%1.1f%%')
+    if len(counts):
+        counts.plot.pie(ax=ax, autopct='%1.1f%%')
     ax.set_ylabel('')
-    buf = io.BytesIO()
-    fig.savefig(buf, format='png', bbox_inches='tight')
-    plt.close(fig)
-    buf.seek(0)
-    return buf.read()
+    return _png(fig)
 
 
-def _plot_mass_bar(df: pd.DataFrame) -> bytes:
-    df['date'] = pd.to_datetime(df['timestamp_utc']).dt.date
-    s = df.groupby('date')['loadcell_grams'].apply(lambda x: pd.to_numeric(x, errors='coerce').sum())
+def _plot_mass_bar(daily_mass: pd.Series) -> bytes:
     fig, ax = plt.subplots(figsize=(8,4))
-    s.plot.bar(ax=ax)
+    if len(daily_mass):
+        daily_mass.plot.bar(ax=ax)
     ax.set_ylabel('mass (g)')
-    buf = io.BytesIO()
-    fig.savefig(buf, format='png', bbox_inches='tight')
-    plt.close(fig)
-    buf.seek(0)
-    return buf.read()
+    return _png(fig)
 
 
-def _plot_tds_line(df: pd.DataFrame) -> bytes:
-    df['ts'] = pd.to_datetime(df['timestamp_utc'])
-    s = pd.to_numeric(df['tds_ppm'], errors='coerce')
+def _plot_tds_line(tds: pd.Series) -> bytes:
     fig, ax = plt.subplots(figsize=(8,3))
-    s.plot(ax=ax)
+    if len(tds):
+        tds.plot(ax=ax)
     ax.set_ylabel('TDS (ppm)')
-    buf = io.BytesIO()
-    fig.savefig(buf, format='png', bbox_inches='tight')
-    plt.close(fig)
-    buf.seek(0)
-    return buf.read()
+    return _png(fig)
 
 
-def build_pdf():
-    if not CSV.exists():
-        raise FileNotFoundError("No telemetry CSV found")
-    df = pd.read_csv(CSV)
-    pie_png = _plot_pie(df)
-    mass_png = _plot_mass_bar(df)
-    tds_png = _plot_tds_line(df)
+def _plot_heatmap(heat) -> bytes:
+    # rendered directly from the data (no browser); None when there are no positions
+    if not len(heat):
+        return None
+    try:
+        buf = io.BytesIO()
+        render_heatmap_png(heat, buf, width=1000, height=600)
+        return buf.getvalue()
+    except Exception:
+        logger.exception('failed to render heatmap png')
+        return None
+
 
-    c = canvas.Canvas(str(OUT_PDF), pagesize=A4)
+def render_report(data: dict, out: Path, title: str = None) -> Path:
+    """Draw the charts for `data` (see summarize) and write the PDF to `out`."""
+    pie_png = _plot_pie(data['subtype_counts'])
+    mass_png = _plot_mass_bar(data['daily_mass'])
+    tds_png = _plot_tds_line(data['tds'])
+
+    c = canvas.Canvas(str(out), pagesize=A4)
     width, height = A4
     c.setFont('Helvetica-Bold', 16)
     c.drawString(40, height - 40, 'Waste Segregation Report')
+    if title:
+        c.setFont('Helvetica', 11)
+        c.drawString(40, height - 56, title)
 
     c.drawImage(ImageReader(io.BytesIO(pie_png)), 40, height - 300, width=240, height=240)
     c.drawImage(ImageReader(io.BytesIO(mass_png)), 300, height - 300, width=240, height=180)
     c.drawImage(ImageReader(io.BytesIO(tds_png)), 40, height - 560, width=500, height=150)
 
-    if HEATMAP_PNG.exists():
-        try:
-            c.drawImage(str(HEATMAP_PNG), 40, 40, width=500, height=300)
-        except Exception:
-            logger.exception('failed to add heatmap png')
+    heat_png = _plot_heatmap(data['heat'])
+    if heat_png is not None:
+        c.drawImage(ImageReader(io.BytesIO(heat_png)), 40, 40, width=500, height=300)
 
     # add reference to presentation if exists
     if PRESENTATION.exists():
@@ -87,11 +143,87 @@ def build_pdf():
 
     c.showPage()
     c.save()
-    print('Saved report to', OUT_PDF)
+    return out
+
+
+def build_pdf(start=None, end=None, boat_id=None, out: Path = OUT_PDF):
+    if not CSV.exists():
+        raise FileNotFoundError("No telemetry CSV found")
+    render_report(prepare_report_data(start=start, end=end, boat_id=boat_id), out)
+    print('Saved report to', out)
+    return out
+
+
+def _safe_name(value) -> str:
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', str(value)).strip('_') or 'unknown'
+
+
+def report_jobs(df: pd.DataFrame, by=('boat', 'day'), out_dir: Path = REPORTS_DIR):
+    """(summary, out path, title) for each boat / day / boat-day group of one loaded frame."""
+    day = df['timestamp_utc'].dt.date
+    groupings = {
+        'boat': ([df['boat_id']], lambda k: (f"boat_{_safe_name(k)}", f"Boat {k}")),
+        'day': ([day], lambda k: (f"day_{k}", f"Day {k}")),
+        'boat_day': ([df['boat_id'], day], lambda k: (f"boat_{_safe_name(k[0])}_{k[1]}", f"Boat {k[0]}, {k[1]}")),
+    }
+    for mode in by:
+        keys, label = groupings[mode]
+        for key, grp in df.groupby(keys if len(keys) > 1 else keys[0], sort=True):
+            name, title = label(key)
+            yield summarize(grp), Path(out_dir) / f"report_{name}.pdf", title
+
+
+def _render_job(job):
+    # runs in a worker process
+    data, out, title = job
+    return render_report(data, out, title)
+
+
+def build_reports(start=None, end=None, by=('boat', 'day'), out_dir: Path = REPORTS_DIR, workers: int = None):
+    """Batch mode: one PDF per boat and/or per day (or per boat-day) in [start, end].
+
+    The telemetry window is loaded and grouped once in this process; only the
+    small per-report summaries are sent to a process pool, which renders the
+    charts and writes the PDFs. Returns the written paths in group order.
+    """
+    if not CSV.exists():
+        raise FileNotFoundError("No telemetry CSV found")
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    df = load_report_frame(start, end, with_boat=True)
+    df = df[df['timestamp_utc'].notna()]
+    jobs = list(report_jobs(df, by, out_dir))
+    workers = (os.cpu_count() or 1) if workers is None else max(1, int(workers))
+    if workers == 1 or len(jobs) < 2:
+        paths = [_render_job(j) for j in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            paths = list(pool.map(_render_job, jobs))
+    logger.info("Saved %d reports to %s", len(paths), out_dir)
+    return paths
 
 
 if __name__ == '__main__':
+    import argparse
+    p = argparse.ArgumentParser(description='Build the PDF telemetry report')
+    p.add_argument('--start', help='first day/time to include (ISO)')
+    p.add_argument('--end', help='last day/time to include (ISO)')
+    p.add_argument('--days', type=int, help='only the last N days (overrides --start)')
+    p.add_argument('--boat-id')
+    p.add_argument('--out', default=str(OUT_PDF))
+    p.add_argument('--batch', help='comma-separated groupings for one PDF each: boat, day, boat_day')
+    p.add_argument('--out-dir', default=str(REPORTS_DIR), help='batch output directory')
+    p.add_argument('--workers', type=int, help='batch rendering processes (default: all CPUs)')
+    a = p.parse_args()
+    start = a.start
+    if a.days:
+        start = (pd.Timestamp.now('UTC').tz_localize(None) - pd.Timedelta(days=a.days)).strftime('%Y-%m-%d %H:%M:%S')
     try:
-        build_pdf()
+        if a.batch:
+            paths = build_reports(start=start, end=a.end, by=[b.strip() for b in a.batch.split(',') if b.strip()],
+                                  out_dir=Path(a.out_dir), workers=a.workers)
+            print(f'Saved {len(paths)} reports to', a.out_dir)
+        else:
+            build_pdf(start=start, end=a.end, boat_id=a.boat_id, out=Path(a.out))
     except Exception as e:
         logger.exception('report generation failed: %s', e)
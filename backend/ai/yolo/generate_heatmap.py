@@ -1,8 +1,19 @@
+import numpy as np
 import pandas as pd
 from folium import Map
 from folium.plugins import HeatMap
 from pathlib import Path
 import logging
+import os
+import sys
+
+try:
+    from ..analytics.aggregate_daily import category_weights
+    from ..analytics.parquet_store import read_telemetry
+except ImportError:
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+    from analytics.aggregate_daily import category_weights
+    from analytics.parquet_store import read_telemetry
 
 logger = logging.getLogger("heatmap")
 
@@ -11,77 +22,150 @@ OUT = Path(__file__).resolve().parents[2] / "data" / "heatmap.html"
 OUT_PNG = Path(__file__).resolve().parents[2] / "data" / "heatmap_snapshot.png"
 
 
-def load_csv():
-    if not CSV.exists():
-        raise FileNotFoundError(f"No CSV at {CSV}")
-    df = pd.read_csv(CSV)
+HEAT_COLUMNS = ['lat', 'lon', 'waste_category']
+# upper bound on points handed to folium; denser data is pre-binned on a grid
+MAX_HEAT_POINTS = 5000
+
+
+def load_csv(start=None, end=None, boat_id=None):
+    # reads the Parquet store when available (only the days in [start, end]),
+    # otherwise the CSV; heat columns only
+    cols = HEAT_COLUMNS + (['boat_id'] if boat_id else [])
+    df = read_telemetry(CSV, columns=cols, start=start, end=end)
+    if boat_id:
+        df = df[df['boat_id'] == boat_id].reset_index(drop=True)
     return df
 
 
-def prepare_heat_data(df: pd.DataFrame):
-    # expect columns lat, lon, waste_category
-    df = df[pd.to_numeric(df['lat'], errors='coerce').notnull()]
-    df['lat'] = pd.to_numeric(df['lat'])
-    df['lon'] = pd.to_numeric(df['lon'])
-    heat_data = []
-    for r in df.itertuples(index=False):
-        try:
-            w = 1.0
-            pred = getattr(r, 'waste_category', '') or ''
-            if isinstance(pred, str):
-                p = pred.lower()
-                if 'hazard' in p:
-                    w = 3.0
-                elif 'wet' in p:
-                    w = 2.0
-            heat_data.append([r.lat, r.lon, w])
-        except Exception:
-            continue
-    return heat_data
+def prepare_heat_data(df: pd.DataFrame, max_points: int = MAX_HEAT_POINTS) -> np.ndarray:
+    """float32 array of [lat, lon, weight] rows (hazard 3, wet 2, other 1).
+
+    Rows without a position are dropped. With more than `max_points` rows the
+    points are binned on a grid over their bounding box; each occupied cell
+    becomes one point at the weighted centroid carrying the summed weight.
+    """
+    lat = pd.to_numeric(df['lat'], errors='coerce').to_numpy(dtype=np.float64)
+    lon = pd.to_numeric(df['lon'], errors='coerce').to_numpy(dtype=np.float64)
+    ok = np.isfinite(lat) & np.isfinite(lon)
+    if 'waste_category' in df:
+        w = category_weights(df['waste_category'][ok]).astype(np.float64)
+    else:
+        w = np.ones(int(ok.sum()))
+    lat, lon = lat[ok], lon[ok]
+    if max_points and len(lat) > max_points:
+        lat, lon, w = bin_points(lat, lon, w, max_points)
+    return np.column_stack([lat, lon, w]).astype(np.float32)
+
+
+def bin_points(lat, lon, w, max_points):
+    # an n x n grid has at most max_points cells, so at most that many points come out
+    n = max(1, int(np.sqrt(max_points)))
+    lat0, lon0 = lat.min(), lon.min()
+    dlat = (lat.max() - lat0) / n or 1.0
+    dlon = (lon.max() - lon0) / n or 1.0
+    iy = np.minimum(((lat - lat0) / dlat).astype(np.int64), n - 1)
+    ix = np.minimum(((lon - lon0) / dlon).astype(np.int64), n - 1)
+    cells, inv = np.unique(iy * n + ix, return_inverse=True)
+    wsum = np.bincount(inv, weights=w, minlength=len(cells))
+    clat = np.bincount(inv, weights=lat * w, minlength=len(cells)) / wsum
+    clon = np.bincount(inv, weights=lon * w, minlength=len(cells)) / wsum
+    return clat, clon, wsum
 
 
 def make_map(heat_data, center=None):
-    if center is None and heat_data:
-        center = [heat_data[0][0], heat_data[0][1]]
+    if center is None and len(heat_data):
+        center = [float(heat_data[0][0]), float(heat_data[0][1])]
     elif center is None:
         center = [22.5726, 88.3639]
     m = Map(location=center, zoom_start=13)
-    HeatMap(heat_data).add_to(m)
+    # plain floats for the folium JSON; 6 decimals is ~0.1 m
+    HeatMap(np.round(np.asarray(heat_data, dtype=np.float64), 6).tolist()).add_to(m)
     return m
 
 
-def save_heatmap():
-    df = load_csv()
-    if df.empty:
+def render_heatmap_png(heat_data, out=OUT_PNG, width: int = 1000, height: int = 700, sigma_px: float = None):
+    """Draw [lat, lon, weight] points as a Gaussian kernel density image and save it as PNG.
+
+    No browser involved: points are binned into a width x height weighted
+    histogram, smoothed with a Gaussian (FFT convolution) and coloured with a
+    matplotlib colormap. The extent is the points' bounding box with a margin,
+    with longitude scaled by cos(lat) so distances keep their proportions.
+    `out` may be a path or a binary file object.
+    """
+    from matplotlib import image as mpimg
+
+    pts = np.asarray(heat_data, dtype=np.float64).reshape(-1, 3)
+    if not len(pts):
+        raise ValueError("no heat points to render")
+    lat, lon, w = pts[:, 0], pts[:, 1], pts[:, 2]
+    sigma = sigma_px or max(2.0, 0.015 * max(width, height))
+    x = lon * np.cos(np.radians((lat.min() + lat.max()) / 2))
+    y = lat
+    margin = 3 * sigma
+    # degrees per pixel: fit the bounding box inside the margins (at least ~200 m across)
+    scale = max(np.ptp(x) / (width - 2 * margin), np.ptp(y) / (height - 2 * margin),
+                0.002 / min(width, height))
+    x0 = (x.min() + x.max()) / 2 - width * scale / 2
+    y0 = (y.min() + y.max()) / 2 - height * scale / 2
+    ix = np.clip(((x - x0) / scale).astype(np.int64), 0, width - 1)
+    iy = np.clip(((y - y0) / scale).astype(np.int64), 0, height - 1)
+    grid = np.bincount(iy * width + ix, weights=w, minlength=width * height).reshape(height, width)
+
+    fy = np.fft.fftfreq(height)[:, None]
+    fx = np.fft.rfftfreq(width)[None, :]
+    kernel = np.exp(-2 * (np.pi * sigma) ** 2 * (fx ** 2 + fy ** 2))
+    density = np.fft.irfft2(np.fft.rfft2(grid) * kernel, s=grid.shape)
+    peak = density.max()
+    density = np.sqrt(np.clip(density / peak, 0, 1)) if peak > 0 else density
+
+    if not hasattr(out, 'write'):
+        out = Path(out)
+        out.parent.mkdir(parents=True, exist_ok=True)
+    mpimg.imsave(out, density, cmap='YlOrRd', vmin=0, vmax=1, origin='lower', format='png')
+    return out
+
+
+def save_heatmap(start=None, end=None, boat_id=None, max_points: int = MAX_HEAT_POINTS,
+                 out: Path = OUT, snapshot: bool = True):
+    """Write the heatmap HTML to `out` (atomically) and, with `snapshot`, the PNG to OUT_PNG.
+
+    Returns the HTML path, or None when there is nothing to plot.
+    """
+    df = load_csv(start=start, end=end, boat_id=boat_id)
+    heat_data = prepare_heat_data(df, max_points=max_points)
+    if not len(heat_data):
         logger.info("No data to plot")
-        return
-    heat_data = prepare_heat_data(df)
+        return None
     center = [df['lat'].mean(), df['lon'].mean()]
     m = make_map(heat_data, center=center)
-    OUT.parent.mkdir(parents=True, exist_ok=True)
-    m.save(str(OUT))
-    logger.info("Saved heatmap to %s", OUT)
+    out = Path(out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    # write next to the target and swap it in, so a reader never gets a half-written page
+    tmp = out.with_name(f".{out.name}.tmp")
+    m.save(str(tmp))
+    os.replace(tmp, out)
+    logger.info("Saved heatmap to %s", out)
+    if not snapshot:
+        return out
 
-    # try to snapshot HTML to PNG using selenium if available
+    # static PNG of the same points for the PDF report
     try:
-        from selenium import webdriver
-        from selenium.webdriver.chrome.options import Options
-        opts = Options()
-        opts.headless = True
-        opts.add_argument('--no-sandbox')
-        opts.add_argument('--disable-dev-shm-usage')
-        driver = webdriver.Chrome(options=opts)
-        driver.set_window_size(1200, 800)
-        driver.get(OUT.as_uri())
-        driver.save_screenshot(str(OUT_PNG))
-        driver.quit()
+        render_heatmap_png(heat_data, OUT_PNG)
         logger.info("Saved heatmap snapshot to %s", OUT_PNG)
     except Exception:
-        logger.info("selenium not available or failed; skipping PNG snapshot")
+        logger.exception("failed to render heatmap PNG")
+    return out
 
 
 if __name__ == '__main__':
+    import argparse
+    p = argparse.ArgumentParser(description='Render telemetry heatmap')
+    p.add_argument('--start', help='first day/time to include (ISO)')
+    p.add_argument('--end', help='last day/time to include (ISO)')
+    p.add_argument('--boat-id')
+    p.add_argument('--max-points', type=int, default=MAX_HEAT_POINTS)
+    a = p.parse_args()
     try:
-        save_heatmap()
+        save_heatmap(start=a.start, end=a.end, boat_id=a.boat_id, max_points=a.max_points)
     except Exception as e:
         logger.exception("failed to generate heatmap: %s", e)
@@ -62,8 +62,11 @@ def main():
         if resp:
                 try:
                     os.makedirs(os.path.dirname(DETECT_FILE), exist_ok=True)
-                    with open(DETECT_FILE, "w") as f:
+                    # write then rename so readers never see a partial file
+                    tmp = DETECT_FILE + ".tmp"
+                    with open(tmp, "w") as f:
                         f.write(resp.get("prediction", "-"))
+                    os.replace(tmp, DETECT_FILE)
                 except Exception as e:
                     print("Failed to write detected file:", e)
 
@@ -0,0 +1,318 @@
+"""Building blocks for the staged realtime loop in realtime_yolo_taco.py.
+
+- DropOldestQueue: bounded hand-off between stages that never blocks the producer
+- StageStats: per-stage timings, reported when the loop exits
+- FrameCapture: thread that keeps reading the camera so consumers get the freshest frame
+- FrameUploader: background POSTs to the backend /image endpoint
+- FrameBroadcaster: latest encoded frame + sequence number for any number of stream clients
+- ChangeGate: decides whether a frame differs enough from the last inferred one to run the model
+"""
+import random
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+
+class DropOldestQueue:
+    """Bounded FIFO whose put() never blocks: when full, the oldest item is discarded.
+
+    With maxsize=1 it is a "latest value" slot: a slow consumer always gets the
+    newest item and never works through a backlog of stale frames.
+    """
+
+    def __init__(self, maxsize=1):
+        self.maxsize = max(1, int(maxsize))
+        self.dropped = 0
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Next item, or None once the queue is closed and drained (or on timeout)."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items or self._closed, timeout):
+                return None
+            return self._items.popleft() if self._items else None
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+
+class StageStats:
+    """Thread-safe count / total / max duration per named stage."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+        self.started = time.perf_counter()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            n, total, worst = self._stats.get(stage, (0, 0.0, 0.0))
+            self._stats[stage] = (n + 1, total + seconds, max(worst, seconds))
+
+    def time(self, stage):
+        return _Timed(self, stage)
+
+    def count(self, stage):
+        with self._lock:
+            return self._stats.get(stage, (0, 0.0, 0.0))[0]
+
+    def report(self, extra=None):
+        """Multi-line summary: mean/max ms and rate per stage, plus `extra` counters."""
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        lines = [f"{'stage':<12} {'count':>7} {'mean ms':>9} {'max ms':>9} {'per s':>7}"]
+        with self._lock:
+            for stage, (n, total, worst) in self._stats.items():
+                mean = total / n * 1000 if n else 0.0
+                lines.append(f"{stage:<12} {n:>7d} {mean:>9.1f} {worst * 1000:>9.1f} {n / elapsed:>7.1f}")
+        for name, value in (extra or {}).items():
+            lines.append(f"{name}: {value}")
+        return "\n".join(lines)
+
+
+class _Timed:
+    def __init__(self, stats, stage):
+        self.stats, self.stage = stats, stage
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.stats.add(self.stage, time.perf_counter() - self.t0)
+        return False
+
+
+class FrameCapture(threading.Thread):
+    """Reads `cap` as fast as the camera delivers and keeps only the newest frame.
+
+    Frames go to `out` as (seq, capture_time, frame). The queue is closed when
+    the camera stops delivering or stop() is called.
+    """
+
+    def __init__(self, cap, out: DropOldestQueue, stats: StageStats = None):
+        super().__init__(name="capture", daemon=True)
+        self.cap = cap
+        self.out = out
+        self.stats = stats
+        self.seq = 0
+        self._stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self._stopped.is_set():
+                t0 = time.perf_counter()
+                ret, frame = self.cap.read()
+                if not ret:
+                    print("Failed to read frame")
+                    break
+                if self.stats is not None:
+                    self.stats.add("capture", time.perf_counter() - t0)
+                self.seq += 1
+                self.out.put((self.seq, time.perf_counter(), frame))
+        finally:
+            self.out.close()
+
+    def stop(self):
+        self._stopped.set()
+
+
+class ChangeGate:
+    """Skips inference while the scene matches the last frame the model saw.
+
+    Frames are reduced to a small blurred grayscale thumbnail and compared
+    with the thumbnail of the last inferred frame; the model runs when more
+    than `threshold` of the pixels moved by over `pixel_delta` grey levels,
+    or when `max_skip` seconds have passed since the last inference. Comparing
+    against the last inferred frame (not the previous frame) means slow drift
+    still triggers eventually. threshold <= 0 disables the gate.
+    """
+
+    def __init__(self, threshold=0.01, max_skip=2.0, pixel_delta=12, size=(64, 48)):
+        self.threshold = threshold
+        self.max_skip = max_skip
+        self.pixel_delta = pixel_delta
+        self.size = size
+        self.skipped = 0
+        self._ref = None
+        self._ref_time = 0.0
+
+    def _thumb(self, frame):
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        small = cv2.resize(gray, self.size, interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(small, (3, 3), 0)
+
+    def should_infer(self, frame) -> bool:
+        """True if the model should run on `frame`; the frame then becomes the new reference."""
+        if self.threshold <= 0:
+            return True
+        now = time.monotonic()
+        thumb = self._thumb(frame)
+        if self._ref is not None and now - self._ref_time < self.max_skip:
+            moved = np.count_nonzero(cv2.absdiff(thumb, self._ref) > self.pixel_delta)
+            if moved < self.threshold * thumb.size:
+                self.skipped += 1
+                return False
+        self._ref, self._ref_time = thumb, now
+        return True
+
+
+class FrameBroadcaster:
+    """The latest published frame, numbered, with a condition to wait for the next one.
+
+    Each frame is stored once, however many readers there are. A reader keeps
+    the sequence number it last sent and wait_next() wakes it only when a newer
+    frame exists; one that falls behind gets the newest frame and silently
+    skips the ones in between, so nothing queues up per client.
+    """
+
+    def __init__(self):
+        self.seq = 0
+        self._frame = None
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def publish(self, frame):
+        with self._cond:
+            self.seq += 1
+            self._frame = frame
+            self._cond.notify_all()
+
+    def wait_next(self, after_seq=0, timeout=None):
+        """(seq, frame) for the newest frame with seq > after_seq, or None on timeout / close."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.seq > after_seq or self._closed, timeout):
+                return None
+            if self.seq <= after_seq:
+                return None
+            return self.seq, self._frame
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+
+class FrameUploader:
+    """Posts frames to the backend from background threads.
+
+    At most `max_in_flight` requests run at once, each worker on its own
+    keep-alive `requests.Session`; while they are all busy only the newest
+    `max_pending` frames wait and older ones are dropped, so a slow backend
+    never stalls the camera loop. Failed posts (connection errors, 5xx) are
+    retried up to `retries` times with jittered exponential backoff.
+
+    `on_response(resp, context)` is called from a worker thread with the
+    decoded JSON reply (None on failure) and the `context` passed to submit().
+    """
+
+    def __init__(self, url, on_response=None, max_in_flight=2, max_pending=1, timeout=10,
+                 retries=2, backoff=0.25, jpeg_quality=80):
+        self.url = url
+        self.on_response = on_response
+        self.timeout = timeout
+        self.retries = max(0, int(retries))
+        self.backoff = backoff
+        self.jpeg_quality = int(jpeg_quality)
+        self.stats = {"submitted": 0, "sent": 0, "failed": 0, "retries": 0}
+        self._stats_lock = threading.Lock()
+        self._pending = DropOldestQueue(max_pending)
+        self._closing = threading.Event()
+        self._workers = [threading.Thread(target=self._work, name=f"uploader-{i}", daemon=True)
+                         for i in range(max(1, int(max_in_flight)))]
+        for t in self._workers:
+            t.start()
+
+    def submit(self, frame, context=None):
+        """Queue a BGR frame (or already-encoded JPEG bytes); never blocks."""
+        self._count("submitted")
+        self._pending.put((frame, context))
+
+    @property
+    def dropped(self):
+        return self._pending.dropped
+
+    def close(self, timeout=2.0):
+        """Stop accepting frames and wait up to `timeout` s for posts in progress."""
+        self._closing.set()
+        self._pending.close()
+        deadline = time.monotonic() + timeout
+        for t in self._workers:
+            t.join(max(0.0, deadline - time.monotonic()))
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _work(self):
+        import requests
+
+        session = requests.Session()
+        try:
+            while True:
+                item = self._pending.get()
+                if item is None:
+                    break
+                frame, context = item
+                resp = self._post(session, frame)
+                self._count("sent" if resp is not None else "failed")
+                if self.on_response is not None:
+                    try:
+                        self.on_response(resp, context)
+                    except Exception as e:
+                        print("Upload callback error:", e)
+        finally:
+            session.close()
+
+    def _encode(self, frame):
+        if isinstance(frame, (bytes, bytearray)):
+            return bytes(frame)
+        ok, buf = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality])
+        return buf.tobytes() if ok else None
+
+    def _post(self, session, frame):
+        data = self._encode(frame)
+        if data is None:
+            return None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self._count("retries")
+                # full jitter keeps several uploaders from retrying in lockstep
+                if self._closing.wait(random.uniform(0, self.backoff * 2 ** (attempt - 1))):
+                    return None
+            try:
+                r = session.post(self.url, files={"image": ("frame.jpg", data, "image/jpeg")}, timeout=self.timeout)
+            except Exception as e:
+                print("POST error:", e)
+                continue
+            if r.status_code == 200:
+                try:
+                    return r.json()
+                except ValueError:
+                    return None
+            print("Server returned", r.status_code)
+            if r.status_code < 500 and r.status_code != 429:
+                return None  # client errors will not succeed on retry
+        return None
@@ -0,0 +1,147 @@
+"""IoU / centroid multi-object tracker for the realtime YOLO loop.
+
+Detections from consecutive detector runs are linked into tracks with
+persistent ids. A track is confirmed after `min_hits` matched detections and
+then emits exactly one collection event, however long it stays in view. Its
+confidence is an exponential moving average, so the displayed / written top
+label does not flicker with per-frame noise. Between detector runs
+(`--detect-every N`) boxes are extrapolated with each track's last velocity.
+"""
+import itertools
+
+import numpy as np
+
+
+def iou_matrix(a, b):
+    """Pairwise IoU of (N, 4) and (M, 4) xyxy boxes."""
+    a = np.asarray(a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float64).reshape(-1, 4)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.where(union > 0, union, 1), 0.0)
+
+
+class Track:
+    __slots__ = ("id", "label", "box", "conf", "hits", "misses", "counted",
+                 "det_box", "det_frame", "velocity")
+
+    def __init__(self, track_id, box, label, conf, frame):
+        self.id = track_id
+        self.label = label
+        self.box = np.asarray(box, dtype=np.float64)
+        self.conf = float(conf)
+        self.hits = 1
+        self.misses = 0
+        self.counted = False
+        self.det_box = self.box.copy()  # box at the last matched detection
+        self.det_frame = frame
+        self.velocity = np.zeros(4)  # box change per frame
+
+    def as_dict(self):
+        return {"track_id": self.id, "label": self.label, "conf": round(self.conf, 4),
+                "box": [round(float(v), 1) for v in self.box], "hits": self.hits}
+
+
+class IoUTracker:
+    """Greedy IoU matching (then centroid distance) of same-label boxes to live tracks.
+
+    - iou_threshold: minimum IoU for a match in the first pass
+    - centroid_gate: second pass for fast movers; centre distance as a fraction
+      of the track box diagonal
+    - max_misses: detector runs a track may go unmatched before it is dropped
+    - min_hits: matched detections before a track is confirmed (and counted)
+    - ema: weight of the newest confidence in the smoothed value
+    """
+
+    def __init__(self, iou_threshold=0.3, centroid_gate=0.5, max_misses=3, min_hits=2, ema=0.4):
+        self.iou_threshold = iou_threshold
+        self.centroid_gate = centroid_gate
+        self.max_misses = max_misses
+        self.min_hits = min_hits
+        self.ema = ema
+        self.frame = 0
+        self.tracks = []
+        self.events = 0
+        self._ids = itertools.count(1)
+
+    def _match(self, boxes, labels):
+        pairs = []
+        if not self.tracks or not len(boxes):
+            return pairs
+        track_boxes = np.stack([t.box for t in self.tracks])
+        same = np.array([[t.label == lab for lab in labels] for t in self.tracks])
+        iou = np.where(same, iou_matrix(track_boxes, boxes), 0.0)
+        free_t, free_d = set(range(len(self.tracks))), set(range(len(boxes)))
+        for ti, di in zip(*np.unravel_index(np.argsort(-iou, axis=None), iou.shape)):
+            if iou[ti, di] < self.iou_threshold:
+                break
+            if ti in free_t and di in free_d:
+                pairs.append((ti, di))
+                free_t.discard(ti)
+                free_d.discard(di)
+        if free_t and free_d:
+            tc = (track_boxes[:, :2] + track_boxes[:, 2:]) / 2
+            dc = (np.asarray(boxes)[:, :2] + np.asarray(boxes)[:, 2:]) / 2
+            diag = np.hypot(track_boxes[:, 2] - track_boxes[:, 0], track_boxes[:, 3] - track_boxes[:, 1])
+            dist = np.linalg.norm(tc[:, None] - dc[None, :], axis=2) / np.maximum(diag, 1.0)[:, None]
+            dist = np.where(same, dist, np.inf)
+            for ti, di in zip(*np.unravel_index(np.argsort(dist, axis=None), dist.shape)):
+                if dist[ti, di] > self.centroid_gate:
+                    break
+                if ti in free_t and di in free_d:
+                    pairs.append((ti, di))
+                    free_t.discard(ti)
+                    free_d.discard(di)
+        return pairs
+
+    def update(self, boxes, labels, confs):
+        """Feed one detector run; returns (visible tracks, newly confirmed tracks)."""
+        self.frame += 1
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        self._advance()
+        matched_t, matched_d = set(), set()
+        for ti, di in self._match(boxes, labels):
+            t = self.tracks[ti]
+            t.velocity = (boxes[di] - t.det_box) / max(1, self.frame - t.det_frame)
+            t.box = boxes[di].copy()
+            t.det_box, t.det_frame = t.box.copy(), self.frame
+            t.conf = self.ema * float(confs[di]) + (1 - self.ema) * t.conf
+            t.hits += 1
+            t.misses = 0
+            matched_t.add(ti)
+            matched_d.add(di)
+        for ti, t in enumerate(self.tracks):
+            if ti not in matched_t:
+                t.misses += 1
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+        for di in range(len(boxes)):
+            if di not in matched_d:
+                self.tracks.append(Track(next(self._ids), boxes[di], labels[di], confs[di], self.frame))
+
+        confirmed = []
+        for t in self.tracks:
+            if not t.counted and t.hits >= self.min_hits:
+                t.counted = True
+                confirmed.append(t)
+        self.events += len(confirmed)
+        return self.visible(), confirmed
+
+    def predict(self):
+        """Advance one frame without a detector run; returns the visible tracks at their extrapolated boxes."""
+        self.frame += 1
+        self._advance()
+        return self.visible()
+
+    def _advance(self):
+        for t in self.tracks:
+            t.box = t.det_box + t.velocity * (self.frame - t.det_frame)
+
+    def visible(self):
+        # seen at the last detector run, or confirmed and coasting through a short miss
+        return [t for t in self.tracks if t.misses == 0 or t.hits >= self.min_hits]
@@ -13,58 +13,82 @@ Usage examples:
 """
 import argparse
 import os
+import sys
+import tempfile
 import time
 import threading
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
+from urllib.parse import parse_qs, urlparse
 import cv2
 
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from realtime_pipeline import ChangeGate, DropOldestQueue, FrameBroadcaster, FrameCapture, FrameUploader, StageStats
+from realtime_tracker import IoUTracker
+
 mjpeg_server = None
-latest_jpeg = None
+# annotated JPEGs for the MJPEG stream; published once, read by every client
+broadcaster = FrameBroadcaster()
 
 
 class MJPEGHandler(BaseHTTPRequestHandler):
+    """Serves /stream as multipart JPEG; `?fps=N` caps this client's frame rate."""
+
     def do_GET(self):
-        if self.path != '/stream':
+        url = urlparse(self.path)
+        if url.path != '/stream':
             self.send_response(404)
             self.end_headers()
             return
+        max_fps = self.server.max_fps
+        try:
+            fps = float(parse_qs(url.query).get('fps', ['0'])[0])
+        except ValueError:
+            fps = 0.0
+        if fps > 0:
+            max_fps = min(fps, max_fps) if max_fps else fps
+        min_gap = 1.0 / max_fps if max_fps else 0.0
+
         self.send_response(200)
         self.send_header('Age', 0)
         self.send_header('Cache-Control', 'no-cache, private')
         self.send_header('Pragma', 'no-cache')
         self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=frame')
         self.end_headers()
+        seq = 0
         try:
-            while True:
-                if latest_jpeg is None:
-                    time.sleep(0.05)
+            while not broadcaster.closed:
+                item = broadcaster.wait_next(seq, timeout=1.0)
+                if item is None:
                     continue
-                self.wfile.write(b'--frame\r\n')
-                self.wfile.write(b'Content-Type: image/jpeg\r\n')
-                self.wfile.write(b'Content-Length: ' + str(len(latest_jpeg)).encode() + b'\r\n\r\n')
-                self.wfile.write(latest_jpeg)
-                self.wfile.write(b'\r\n')
-                time.sleep(0.04)
+                sent_at = time.monotonic()
+                seq, jpeg = item
+                self.wfile.write(b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: '
+                                 + str(len(jpeg)).encode() + b'\r\n\r\n' + jpeg + b'\r\n')
+                if min_gap:
+                    # frames published meanwhile are skipped, not queued
+                    time.sleep(max(0.0, min_gap - (time.monotonic() - sent_at)))
         except Exception:
             # client disconnected
             pass
 
 
-def start_mjpeg_server(host='127.0.0.1', port=8090):
+def start_mjpeg_server(host='127.0.0.1', port=8090, max_fps=0.0):
     global mjpeg_server
     if mjpeg_server:
         return mjpeg_server
     try:
-        mjpeg_server = HTTPServer((host, port), MJPEGHandler)
+        mjpeg_server = ThreadingHTTPServer((host, port), MJPEGHandler)
     except OSError as e:
         print(f"MJPEG server failed to start on {host}:{port}: {e}")
         mjpeg_server = None
         return None
+    mjpeg_server.daemon_threads = True
+    mjpeg_server.max_fps = max_fps
 
     thread = threading.Thread(target=mjpeg_server.serve_forever, daemon=True)
     thread.start()
-    print(f"MJPEG stream at http://{host}:{port}/stream")
+    print(f"MJPEG stream at http://{host}:{mjpeg_server.server_port}/stream")
     return mjpeg_server
 
 # keyword sets reused across classification helpers
@@ -102,41 +126,50 @@ def try_import_ultralytics():
         return None
 
 
-def post_frame_to_server(server_url, frame, timeout=10):
-    import requests
-    import io
-
-    # encode as JPEG
-    ret, buf = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
-    if not ret:
-        return None
-    files = {"image": ("frame.jpg", buf.tobytes(), "image/jpeg")}
-    try:
-        r = requests.post(server_url, files=files, timeout=timeout)
-        if r.status_code == 200:
-            return r.json()
-        else:
-            print("Server returned", r.status_code)
-            return None
-    except Exception as e:
-        print("POST error:", e)
+def make_uploader(args, on_response):
+    """Background FrameUploader for --server-url, or None when no server is configured."""
+    if not args.server_url:
         return None
+    return FrameUploader(args.server_url, on_response=on_response,
+                         max_in_flight=args.upload_window, retries=args.upload_retries)
+
+
+def upload_summary(uploader) -> str:
+    return ', '.join(f"{k} {v}" for k, v in uploader.stats.items()) + f", dropped {uploader.dropped}"
+
+
+# pause between posted frames in the no-ultralytics fallback (one server upload per frame)
+FALLBACK_INTERVAL = 0.2
+
+
+# the main loop and the uploader's response callbacks all write the detected file
+_detected_lock = threading.Lock()
 
 
 def write_detected_file(path: Path, text: str):
-    try:
-        path.parent.mkdir(parents=True, exist_ok=True)
-        with open(path, 'w', encoding='utf-8') as f:
-            f.write(text)
-    except Exception as e:
-        print("Failed to write detected file:", e)
+    # write to a unique temp file and rename so pollers never read a half-written file
+    with _detected_lock:
+        tmp = None
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.", suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp, path)
+        except Exception as e:
+            print("Failed to write detected file:", e)
+            if tmp is not None:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
 
 
-def annotate_frame(frame, boxes, labels, confs, classes_names):
+def annotate_frame(frame, boxes, labels, confs, classes_names, track_ids=None):
     # boxes: list of [x1,y1,x2,y2]
-    for bb, lab, c in zip(boxes, labels, confs):
+    for i, (bb, lab, c) in enumerate(zip(boxes, labels, confs)):
         x1, y1, x2, y2 = map(int, bb)
-        label = f"{lab} {c:.2f}"
+        label = f"{lab} {c:.2f}" if track_ids is None else f"#{track_ids[i]} {lab} {c:.2f}"
         color = (0, 200, 0)
         cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
         # put label background
@@ -238,166 +271,280 @@ def open_capture(device, width, height):
     return None
 
 
-def run_local_model(args):
-    YOLO = try_import_ultralytics()
-    if YOLO is None:
-        print("ultralytics not installed — local inference unavailable")
-        return False
+def extract_detections(results, model, ignore_set):
+    """Boxes, labels and confidences from ultralytics results, minus ignored classes."""
+    boxes = []
+    labels = []
+    confs = []
+    for r in results:
+        if not hasattr(r, 'boxes'):
+            continue
+        b = r.boxes
+        # ultralytics: b.xyxy, b.cls, b.conf
+        xyxy = getattr(b, 'xyxy', None)
+        cls_idx = getattr(b, 'cls', None)
+        confidences = getattr(b, 'conf', None)
+        if xyxy is None:
+            continue
+        for i in range(len(xyxy)):
+            box = xyxy[i].cpu().numpy() if hasattr(xyxy[i], 'cpu') else xyxy[i]
+            ci = int(cls_idx[i].item()) if cls_idx is not None else 0
+            name = model.names.get(ci, str(ci)) if hasattr(model, 'names') else str(ci)
+            conf_val = float(confidences[i].item()) if confidences is not None else 0.0
+            if name.lower() in ignore_set:
+                continue
+            boxes.append(box)
+            labels.append(name)
+            confs.append(conf_val)
+    return boxes, labels, confs
 
-    model_path = args.model or "yolov8n.pt"
-    print("Loading model:", model_path)
-    model = YOLO(model_path)
 
-    cap = open_capture(args.camera_device, args.width, args.height)
-    if cap is None or not cap.isOpened():
-        print("Cannot open webcam (tried default and DirectShow)")
-        return False
+def publish_detections(args, frame, boxes, labels, confs, names, uploader=None, track_ids=None, outputs=True):
+    """Annotate, update the MJPEG buffer, write the detected file and queue the upload; returns the annotated frame.
 
-    # start MJPEG server for browser overlay
-    start_mjpeg_server(host='127.0.0.1', port=args.mjpeg_port)
+    With `outputs=False` (detections unchanged since the last call) only the
+    preview / MJPEG frame is refreshed; the detected file and the upload are skipped.
+    """
+    annotated = annotate_frame(frame.copy(), boxes, labels, confs, names, track_ids)
+
+    # compute wet/dry percentages for on-screen display
+    wet_pct, dry_pct = compute_wet_dry_percentages(labels, confs, conf_threshold=args.conf)
+    overlay = f"Wet: {wet_pct:.1f}%  Dry: {dry_pct:.1f}%"
+    cv2.putText(
+        annotated,
+        overlay,
+        (10, 30),
+        cv2.FONT_HERSHEY_SIMPLEX,
+        0.8,
+        (0, 200, 0),
+        2,
+        cv2.LINE_AA,
+    )
+
+    # publish to MJPEG clients
+    ok, buf = cv2.imencode('.jpg', annotated, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
+    if ok:
+        broadcaster.publish(buf.tobytes())
+
+    # determine top detection
+    top_text = "-"
+    if confs:
+        best_idx = int(max(range(len(confs)), key=lambda i: confs[i]))
+        top_text = f"{labels[best_idx]}:{confs[best_idx]:.2f}"
+
+    # classify waste state and hazard from detected labels
+    waste_state, hazard, hazard_type = classify_waste_and_hazard(labels, confs, conf_threshold=args.conf)
+
+    # write extended detected info as JSON-like text for ESP32/ESP8266
+    detected_payload = {
+        'prediction': top_text,
+        'waste_state': waste_state,
+        'hazard': int(hazard),
+        'hazard_type': hazard_type,
+    }
+
+    if outputs and args.write_detected:
+        # write compact JSON-like single-line to detected file
+        try:
+            import json
 
-    print("Press 'q' to quit. Running local inference.")
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("Failed to read frame")
-            break
+            write_detected_file(Path(args.write_detected), json.dumps(detected_payload))
+        except Exception:
+            # fallback: write simple string
+            write_detected_file(Path(args.write_detected), top_text)
 
-        # run inference
-        try:
-            results = model(frame, conf=args.conf, device=args.device)
-        except Exception as e:
-            print("Model inference error:", e)
-            break
+    # optionally post to server (in the background; the reply is handled by on_server_detection)
+    if outputs and uploader is not None:
+        uploader.submit(frame, detected_payload)
 
-        boxes = []
-        labels = []
-        confs = []
-        ignore_set = {s.strip().lower() for s in args.ignore_classes.split(',') if s.strip()}
+    return annotated
 
-        for r in results:
-            if not hasattr(r, 'boxes'):
-                continue
-            b = r.boxes
-            # ultralytics: b.xyxy, b.cls, b.conf
-            xyxy = getattr(b, 'xyxy', None)
-            cls_idx = getattr(b, 'cls', None)
-            confidences = getattr(b, 'conf', None)
-            if xyxy is None:
-                continue
-            for i in range(len(xyxy)):
-                box = xyxy[i].cpu().numpy() if hasattr(xyxy[i], 'cpu') else xyxy[i]
-                ci = int(cls_idx[i].item()) if cls_idx is not None else 0
-                name = model.names.get(ci, str(ci)) if hasattr(model, 'names') else str(ci)
-                conf_val = float(confidences[i].item()) if confidences is not None else 0.0
-                if name.lower() in ignore_set:
-                    continue
-                boxes.append(box)
-                labels.append(name)
-                confs.append(conf_val)
-
-        # annotate
-        annotated = annotate_frame(frame.copy(), boxes, labels, confs, getattr(model, 'names', {}))
-
-        # compute wet/dry percentages for on-screen display
-        wet_pct, dry_pct = compute_wet_dry_percentages(labels, confs, conf_threshold=args.conf)
-        overlay = f"Wet: {wet_pct:.1f}%  Dry: {dry_pct:.1f}%"
-        cv2.putText(
-            annotated,
-            overlay,
-            (10, 30),
-            cv2.FONT_HERSHEY_SIMPLEX,
-            0.8,
-            (0, 200, 0),
-            2,
-            cv2.LINE_AA,
-        )
-
-        # update MJPEG buffer
-        global latest_jpeg
-        ok, buf = cv2.imencode('.jpg', annotated, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
-        if ok:
-            latest_jpeg = buf.tobytes()
 
-        # determine top detection
-        top_text = "-"
-        if confs:
-            best_idx = int(max(range(len(confs)), key=lambda i: confs[i]))
-            top_text = f"{labels[best_idx]}:{confs[best_idx]:.2f}"
+def tracked_detections(tracks):
+    """(boxes, labels, smoothed confs, track ids) of tracker output."""
+    return [t.box for t in tracks], [t.label for t in tracks], [t.conf for t in tracks], [t.id for t in tracks]
+
 
-        # classify waste state and hazard from detected labels
-        waste_state, hazard, hazard_type = classify_waste_and_hazard(labels, confs, conf_threshold=args.conf)
+def record_collection(args, track):
+    """One event per confirmed track: printed, and appended as a JSON line to --events-file."""
+    import json
+
+    waste_state, hazard, hazard_type = classify_waste_and_hazard([track.label], [track.conf], conf_threshold=0.0)
+    event = {'ts': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()), **track.as_dict(),
+             'waste_state': waste_state, 'hazard': int(hazard), 'hazard_type': hazard_type}
+    print(f"Collected #{track.id} {track.label} ({track.conf:.2f})")
+    if args.events_file:
+        try:
+            path = Path(args.events_file)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(event) + '\n')
+        except Exception as e:
+            print("Failed to write collection event:", e)
 
-        # write extended detected info as JSON-like text for ESP32/ESP8266
-        detected_payload = {
-            'prediction': top_text,
-            'waste_state': waste_state,
-            'hazard': int(hazard),
-            'hazard_type': hazard_type,
-        }
 
+def on_server_detection(args):
+    """Upload callback for local mode: a server prediction overrides the local one in the detected file."""
+    def handle(resp, local):
+        if not (resp and isinstance(resp, dict) and resp.get('prediction')):
+            return
+        top_text = resp.get('prediction')
+        # prefer server-provided waste_state/hazard if present
+        srv_waste_state = resp.get('waste_state') or resp.get('soil_state')
+        srv_hazard = resp.get('hazard')
+        srv_hazard_type = resp.get('hazard_type')
         if args.write_detected:
-            # write compact JSON-like single-line to detected file
             try:
                 import json
-
-                write_detected_file(Path(args.write_detected), json.dumps(detected_payload))
+                payload = {'prediction': top_text, 'waste_state': srv_waste_state or local['waste_state'], 'hazard': int(srv_hazard) if srv_hazard is not None else int(local['hazard']), 'hazard_type': srv_hazard_type or local['hazard_type']}
+                write_detected_file(Path(args.write_detected), json.dumps(payload))
             except Exception:
-                # fallback: write simple string
                 write_detected_file(Path(args.write_detected), top_text)
+    return handle
 
-        # optionally post to server
-        if args.server_url:
-            resp = post_frame_to_server(args.server_url, frame)
-            if resp and isinstance(resp, dict) and resp.get('prediction'):
-                top_text = resp.get('prediction')
-                # prefer server-provided waste_state/hazard if present
-                srv_waste_state = resp.get('waste_state') or resp.get('soil_state')
-                srv_hazard = resp.get('hazard')
-                srv_hazard_type = resp.get('hazard_type')
-                if args.write_detected:
-                    try:
-                        import json
-                        payload = {'prediction': top_text, 'waste_state': srv_waste_state or waste_state, 'hazard': int(srv_hazard) if srv_hazard is not None else int(hazard), 'hazard_type': srv_hazard_type or hazard_type}
-                        write_detected_file(Path(args.write_detected), json.dumps(payload))
-                    except Exception:
-                        write_detected_file(Path(args.write_detected), top_text)
 
-        if not args.no_display:
-            cv2.imshow("YOLO Realtime", annotated)
+def run_local_model(args):
+    """Capture, inference and publishing run as three stages.
 
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
+    A capture thread keeps only the newest camera frame, an inference thread
+    takes whatever is newest when the model is free, and the main thread
+    annotates/encodes/publishes results (and owns the preview window). The
+    stages are joined by drop-oldest queues, so nothing waits on a backlog and
+    frame rate and latency are bounded by inference alone.
+    """
+    YOLO = try_import_ultralytics()
+    if YOLO is None:
+        print("ultralytics not installed — local inference unavailable")
+        return False
+
+    model_path = args.model or "yolov8n.pt"
+    print("Loading model:", model_path)
+    model = YOLO(model_path)
 
-        time.sleep(args.interval)
+    cap = open_capture(args.camera_device, args.width, args.height)
+    if cap is None or not cap.isOpened():
+        print("Cannot open webcam (tried default and DirectShow)")
+        return False
 
-    cap.release()
-    cv2.destroyAllWindows()
+    # start MJPEG server for browser overlay
+    start_mjpeg_server(host='127.0.0.1', port=args.mjpeg_port, max_fps=args.mjpeg_max_fps)
+
+    ignore_set = {s.strip().lower() for s in args.ignore_classes.split(',') if s.strip()}
+    names = getattr(model, 'names', {})
+    stats = StageStats()
+    frames = DropOldestQueue(1)
+    detections = DropOldestQueue(2)
+    stop = threading.Event()
+    capture = FrameCapture(cap, frames, stats)
+    uploader = make_uploader(args, on_server_detection(args))
+    gate = ChangeGate(threshold=args.gate_threshold, max_skip=args.gate_max_skip)
+    tracker = IoUTracker(min_hits=args.track_min_hits)
+    detect_every = max(1, args.detect_every)
+
+    def infer_loop():
+        dets = None
+        since_detect = 0
+        try:
+            while not stop.is_set():
+                item = frames.get(timeout=0.5)
+                if item is None:
+                    if frames.closed:
+                        break
+                    continue
+                seq, t_capture, frame = item
+                if dets is not None and since_detect < detect_every - 1:
+                    # between detector runs the tracker extrapolates the boxes
+                    since_detect += 1
+                    dets = tracked_detections(tracker.predict())
+                    detections.put((seq, t_capture, frame, dets))
+                    continue
+                with stats.time('gate'):
+                    changed = gate.should_infer(frame) or dets is None
+                if not changed:
+                    # static scene: keep the stream live with the previous detections
+                    detections.put((seq, t_capture, frame, dets))
+                    continue
+                try:
+                    with stats.time('inference'):
+                        results = model(frame, conf=args.conf, device=args.device)
+                        boxes, labels, confs = extract_detections(results, model, ignore_set)
+                except Exception as e:
+                    print("Model inference error:", e)
+                    break
+                since_detect = 0
+                tracks, confirmed = tracker.update(boxes, labels, confs)
+                for t in confirmed:
+                    record_collection(args, t)
+                dets = tracked_detections(tracks)
+                detections.put((seq, t_capture, frame, dets))
+                if args.interval:
+                    # optional throttle, e.g. to leave CPU for other processes
+                    stop.wait(args.interval)
+        finally:
+            detections.close()
+
+    infer = threading.Thread(target=infer_loop, name="inference", daemon=True)
+    print("Press 'q' to quit. Running local inference.")
+    capture.start()
+    infer.start()
+    last_dets = None
+    try:
+        while True:
+            item = detections.get(timeout=0.05)
+            if item is None:
+                if detections.closed:
+                    break
+                # keep the preview window responsive while waiting for the model
+                if not args.no_display and cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+                continue
+            seq, t_capture, frame, dets = item
+            boxes, labels, confs, track_ids = dets
+            # a gate skip re-queues the very same dets tuple: nothing new for detected.txt or the server
+            outputs = dets is not last_dets
+            last_dets = dets
+            with stats.time('publish'):
+                annotated = publish_detections(args, frame, boxes, labels, confs, names, uploader, track_ids, outputs)
+            stats.add('end_to_end', time.perf_counter() - t_capture)
+
+            if not args.no_display:
+                cv2.imshow("YOLO Realtime", annotated)
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        capture.stop()
+        capture.join(timeout=2)
+        infer.join(timeout=5)
+        if uploader is not None:
+            uploader.close()
+        broadcaster.close()
+        cap.release()
+        if not args.no_display:
+            cv2.destroyAllWindows()
+        print(stats.report({
+            'frames captured': capture.seq,
+            'skipped before inference': frames.dropped,
+            'skipped before publish': detections.dropped,
+            'inference skipped (unchanged scene)': gate.skipped,
+            'collection events': tracker.events,
+            **({'uploads': upload_summary(uploader)} if uploader is not None else {}),
+        }))
     return True
 
 
 def run_fallback_posting(args):
     # fallback: capture frames and POST to server like post_webcam_demo
-    import requests
-
+    # every POST stores an image and a CSV row on the server, so keep the old pace unless asked otherwise
+    interval = FALLBACK_INTERVAL if args.interval is None else args.interval
     cap = open_capture(args.camera_device, args.width, args.height)
     if cap is None or not cap.isOpened():
         print("Cannot open webcam (tried default and DirectShow)")
         return False
 
-    print("ultralytics not available — posting frames to server")
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("Failed to read frame")
-            break
-
-        # show preview
-        if not args.no_display:
-            cv2.imshow("YOLO Realtime (POST)", frame)
-
-        # post
-        resp = post_frame_to_server(args.server_url, frame) if args.server_url else None
+    def on_response(resp, _context):
         top_text = '-'
         if resp and isinstance(resp, dict):
             top_text = resp.get('prediction', top_text)
@@ -416,13 +563,37 @@ def run_fallback_posting(args):
             if args.write_detected:
                 write_detected_file(Path(args.write_detected), top_text)
 
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
+    uploader = make_uploader(args, on_response)
+    print("ultralytics not available — posting frames to server")
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                print("Failed to read frame")
+                break
 
-        time.sleep(args.interval)
+            # show preview
+            if not args.no_display:
+                cv2.imshow("YOLO Realtime (POST)", frame)
 
-    cap.release()
-    cv2.destroyAllWindows()
+            # post in the background; while uploads are busy only the newest frame waits
+            if uploader is not None:
+                uploader.submit(frame)
+
+            if not args.no_display and cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+
+            if interval > 0:
+                time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if uploader is not None:
+            uploader.close()
+            print('uploads:', upload_summary(uploader))
+        cap.release()
+        if not args.no_display:
+            cv2.destroyAllWindows()
     return True
 
 
@@ -437,9 +608,19 @@ def parse_args():
     p.add_argument('--camera-device', default=0, type=int, help='Webcam device index (int)')
     p.add_argument('--width', type=int, default=640)
     p.add_argument('--height', type=int, default=480)
-    p.add_argument('--interval', type=float, default=0.2, help='Seconds between frames')
+    p.add_argument('--interval', type=float, default=None,
+                   help='Seconds to pause between inferences (default 0 = as fast as the model runs); '
+                        f'without ultralytics, between posted frames (default {FALLBACK_INTERVAL})')
     p.add_argument('--no-display', action='store_true', help='Do not show preview window')
     p.add_argument('--mjpeg-port', type=int, default=8090, help='Port for MJPEG stream of annotated frames')
+    p.add_argument('--gate-threshold', type=float, default=0.01, help='Re-run the model only when this fraction of pixels changed since the last inferred frame (0 = every frame)')
+    p.add_argument('--gate-max-skip', type=float, default=2.0, help='Re-run the model at least this often (seconds) even on an unchanged scene')
+    p.add_argument('--detect-every', type=int, default=1, help='Run the detector on every Nth frame; the tracker extrapolates boxes in between')
+    p.add_argument('--track-min-hits', type=int, default=2, help='Detections before a track is confirmed and counted as one collection event')
+    p.add_argument('--events-file', help='Append one JSON line per collected object (track) to this file')
+    p.add_argument('--mjpeg-max-fps', type=float, default=0.0, help='Frame rate cap per MJPEG client (0 = every new frame); clients may ask for less with ?fps=N')
+    p.add_argument('--upload-window', type=int, default=2, help='Max concurrent POSTs to --server-url; newer frames replace waiting ones')
+    p.add_argument('--upload-retries', type=int, default=2, help='Retries per POST on connection errors / 5xx (with jittered backoff)')
     return p.parse_args()
 
 
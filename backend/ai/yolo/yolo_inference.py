@@ -1,2 +1,223 @@
-# New file for YOLO inference module
-# Placeholder content for yolo_inference.py
+# ai/yolo/yolo_inference.py
+# Resident YOLOv8 inference engine: the model is loaded once and reused for every
+# prediction. Shared by the FastAPI service and the inference_yolov8.py CLI script.
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+
+MODEL_CANDIDATES = [
+    str(ROOT / "yolov8n.pt"),  # Trained model in yolo directory
+    str(ROOT.parent.parent / "yolov8n.pt"),  # Root directory
+    "./backend/ai/yolo/yolov8n.pt",  # Relative path
+    "/mnt/data/yolov8n.pt"  # Alternative location
+]
+
+
+def resolve_model_path(model=None):
+    """Return the first existing model path, preferring `model` when given.
+
+    Falls back to the pretrained model name (ultralytics downloads it if needed).
+    """
+    for p in [model] + MODEL_CANDIDATES:
+        if p and os.path.exists(p):
+            return p
+    return "yolov8n.pt"
+
+
+def extract_detections(res):
+    """Convert one ultralytics result into a list of detection dicts."""
+    detections = []
+    if res is None or res.boxes is None or len(res.boxes) == 0:
+        return detections
+    for box in res.boxes:
+        try:
+            cls = int(box.cls[0].item())
+        except Exception:
+            cls = int(box.cls[0])
+
+        try:
+            conf = float(box.conf[0].item())
+        except Exception:
+            conf = float(box.conf[0])
+
+        # Get label name
+        if hasattr(res, "names") and res.names:
+            label = res.names.get(cls, f"class_{cls}")
+        else:
+            label = f"class_{cls}"
+
+        # Get bounding box coordinates
+        try:
+            xyxy = box.xyxy[0].tolist() if hasattr(box.xyxy[0], 'tolist') else box.xyxy[0]
+        except Exception:
+            xyxy = [0, 0, 0, 0]
+
+        detections.append({
+            "label": label,
+            "confidence": conf,
+            "class_id": cls,
+            "bbox": xyxy
+        })
+    return detections
+
+
+def format_detections(detections, all_detections=False):
+    """Format detections with the inference_yolov8.py output contract.
+
+    Returns "-" when nothing was detected, the JSON `{"detections", "count"}`
+    document when `all_detections` is set, otherwise the best `label:conf`.
+    """
+    if not detections:
+        return "-"
+    if all_detections:
+        return json.dumps({
+            "detections": detections,
+            "count": len(detections)
+        })
+    best = max(detections, key=lambda x: x["confidence"])
+    return f"{best['label']}:{best['confidence']:.2f}"
+
+
+class ImageDecodeError(ValueError):
+    """A source that could not be read as an image; returned in place of its detections."""
+
+
+def load_image(source):
+    """Decode one source (path, encoded bytes or BGR array) into a BGR array.
+
+    Raises ImageDecodeError when it is not a readable image, so a bad upload
+    fails on its own instead of joining (and breaking) a batch.
+    """
+    import cv2
+    import numpy as np
+
+    if isinstance(source, np.ndarray):
+        img = source
+    else:
+        try:
+            if isinstance(source, (bytes, bytearray, memoryview)):
+                data = np.frombuffer(source, dtype=np.uint8)
+            else:
+                data = np.fromfile(str(source), dtype=np.uint8)
+            img = cv2.imdecode(data, cv2.IMREAD_COLOR) if data.size else None
+        except (OSError, ValueError) as e:
+            raise ImageDecodeError(f"cannot read image {source!r}: {e}") from e
+    if img is None or img.ndim != 3 or img.shape[0] == 0 or img.shape[1] == 0:
+        name = "" if isinstance(source, (bytes, bytearray, memoryview, np.ndarray)) else f": {source}"
+        raise ImageDecodeError(f"not a decodable image{name}")
+    return img
+
+
+class YoloEngine:
+    """Long-lived YOLOv8 model wrapper.
+
+    `load()` imports ultralytics and reads the weights once; `detect()` then only
+    pays for the forward pass. Calls are serialized with a lock because the
+    ultralytics predictor keeps per-call state and is not thread-safe.
+    """
+
+    def __init__(self, model_path=None, conf=0.25, iou=0.45, imgsz=640):
+        self.model_path = model_path
+        self.conf = conf
+        self.iou = iou
+        self.imgsz = imgsz
+        self.model = None
+        self.error = None
+        self.forward_passes = 0  # model.predict calls
+        self.images = 0  # images sent through them
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self.model is not None
+
+    def load(self):
+        """Load the model if not loaded yet. Returns True when the model is usable."""
+        with self._lock:
+            if self.model is not None:
+                return True
+            path = resolve_model_path(self.model_path)
+            try:
+                from ultralytics import YOLO
+                self.model = YOLO(path)
+                self.model_path = path
+                self.error = None
+                print(f"✓ Using model: {path}", file=sys.stderr)
+            except Exception as e:
+                self.model = None
+                self.error = str(e)
+                print(f"⚠ Failed to load model {path}: {e}", file=sys.stderr)
+        return self.model is not None
+
+    def stats(self):
+        return {"forward_passes": self.forward_passes, "images": self.images,
+                "mean_batch": round(self.images / self.forward_passes, 3) if self.forward_passes else 0.0}
+
+    def _forward(self, images):
+        # caller holds the lock; the decoded arrays go in as one batch
+        self.forward_passes += 1
+        self.images += len(images)
+        return self.model.predict(
+            images,
+            batch=len(images),
+            conf=self.conf,
+            iou=self.iou,
+            verbose=False,
+            imgsz=self.imgsz,  # Match training size
+            augment=False  # Disable augmentation for inference
+        )
+
+    def detect(self, sources):
+        """Run inference on a list of image paths/bytes/arrays in one forward pass.
+
+        Returns one entry per source: its list of detection dicts (empty on an
+        inference failure), or an ImageDecodeError for a source that is not a
+        readable image. Sources are decoded first so results always line up
+        with their inputs.
+        """
+        sources = list(sources)
+        if not sources:
+            return []
+        out = [None] * len(sources)
+        images, slots = [], []
+        for i, src in enumerate(sources):
+            try:
+                images.append(load_image(src))
+                slots.append(i)
+            except ImageDecodeError as e:
+                out[i] = e
+        if not images:
+            return out
+        if not self.load():
+            for i in slots:
+                out[i] = []
+            return out
+        with self._lock:
+            try:
+                results = list(self._forward(images))
+                if len(results) != len(images):
+                    # should not happen with decoded arrays; never hand detections to the wrong frame
+                    print(f"Batch returned {len(results)} results for {len(images)} images; predicting one by one", file=sys.stderr)
+                    results = [self._forward([img])[0] for img in images]
+            except Exception as e:
+                print(f"Error during inference: {e}", file=sys.stderr)
+                results = [None] * len(images)
+        for i, res in zip(slots, results):
+            try:
+                out[i] = extract_detections(res)
+            except Exception as e:
+                print(f"Error processing detections: {e}", file=sys.stderr)
+                out[i] = []
+        return out
+
+    def predict(self, source, all_detections=False):
+        """Run inference on one image and return the CLI-formatted prediction."""
+        detections = self.detect([source])[0]
+        if isinstance(detections, ImageDecodeError):
+            print(f"⚠ {detections}", file=sys.stderr)
+            return "-"
+        return format_detections(detections, all_detections=all_detections)
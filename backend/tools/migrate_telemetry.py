@@ -33,30 +33,9 @@ ROOT = Path(__file__).resolve().parents[2]
 DATA_DIR = ROOT / "backend" / "data" if (ROOT / "backend" / "data").exists() else ROOT / "data"
 CSV_FILE = DATA_DIR / "telemetry.csv"
 
-CANONICAL_HEADER = [
-    "timestamp_utc",
-    "device_id",
-    "boat_id",
-    "lat",
-    "lon",
-    "heading_deg",
-    "mq135_ppm",
-    "mq2_ppm",
-    "soil_dry_belt_pct",
-    "soil_wet_belt_pct",
-    "loadcell_grams",
-    "tds_ppm",
-    "ultrasonic_cm",
-    "proximity_inductive",
-    "image_path",
-    "yolo_raw",
-    "waste_category",
-    "waste_subtype",
-    "collection_event",
-    "collection_bin_id",
-    "battery_volt",
-    "rssi",
-]
+# canonical header lives in backend/ai/analytics/telemetry_schema.py
+sys.path.insert(0, str(ROOT / "backend" / "ai"))
+from analytics.telemetry_schema import CANONICAL_HEADER
 
 
 def try_import_classifier():